@@ -0,0 +1,207 @@
+"""
+Benchmarks for the ship generator, the ship graph compiler, the path planners, the
+fire model and the bots in project.py. Every input comes from fixed seeds, so two
+runs on the same machine measure the same work.
+
+    python benchmark.py                        # full run, results in benchmark.json
+    python benchmark.py --sizes 50 100 --q 0.3 --out quick.json
+    python benchmark.py --compare benchmark.json --out new.json
+
+Each operation reports latency percentiles over its samples, node expansions for
+the searches and the peak memory of one call measured with tracemalloc (in a
+separate pass, so tracing does not slow down the timed samples).
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import project
+from project import (BOTS, Simulation, FireSpread, ShipGraph, astar_path, bfs_path,
+                     fire_risk_map, generate_ship, place_entities, ship_graph, update_fire)
+
+SIZES = [50, 100, 200, 500, 1000]
+Q_VALUES = [0.1, 0.3, 0.6]
+
+def percentiles(samples):
+    """Latency summary (milliseconds) of a list of durations in seconds."""
+    ordered = sorted(samples)
+    n = len(ordered)
+    def pick(p):
+        return ordered[min(n - 1, int(p * n))] * 1000
+    return {
+        "n": n,
+        "mean_ms": sum(ordered) / n * 1000,
+        "p50_ms": pick(0.50),
+        "p90_ms": pick(0.90),
+        "p99_ms": pick(0.99),
+        "max_ms": ordered[-1] * 1000,
+    }
+
+def peak_memory(fn):
+    """Peak memory (KiB) allocated while running fn() once."""
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1024
+
+def measure(fn, inputs, with_stats=False):
+    """
+    Times fn(x) for every x in inputs. With with_stats, fn is called as fn(x, stats)
+    and the average of each counter it adds to the stats dict is reported.
+    """
+    samples = []
+    stats = {}
+    for x in inputs:
+        t = time.perf_counter()
+        if with_stats:
+            fn(x, stats)
+        else:
+            fn(x)
+        samples.append(time.perf_counter() - t)
+    row = percentiles(samples)
+    for key, total in sorted(stats.items()):
+        row[f"{key}_mean"] = total / len(samples)
+    return row
+
+def burned_fire(grid, q, rng, ticks):
+    """A fire grown for 'ticks' steps from a random origin (a realistic obstacle set)."""
+    origin = place_entities(grid, rng)[2]
+    fire = FireSpread(grid, [origin], q, rng)
+    for _ in range(ticks):
+        if not fire.spread() and not fire.can_spread():
+            break
+    return set(fire.burning)
+
+def open_pairs(grid, rng, n, avoid=()):
+    cells = [(i, j) for i in range(len(grid)) for j in range(len(grid))
+             if grid[i][j] == 1 and (i, j) not in avoid]
+    return [tuple(rng.sample(cells, 2)) for _ in range(n)]
+
+def bench_size(D, q_values, bot_names, args):
+    """All benchmarks for ships of size D. Returns a list of result rows."""
+    rows = []
+    def add(op, row, q=None, peak=None):
+        row.update({"op": op, "D": D, "q": q})
+        if peak is not None:
+            row["peak_kib"] = peak
+        rows.append(row)
+        print(f"  {op:<18} q={'-' if q is None else q:<5} p50={row['p50_ms']:9.3f} ms"
+              f"  p99={row['p99_ms']:9.3f} ms  n={row['n']}", file=sys.stderr)
+
+    seeds = [args.seed + k for k in range(args.ships)]
+    add("generate_ship", measure(lambda s: generate_ship(D, seed=s), seeds),
+        peak=peak_memory(lambda: generate_ship(D, seed=seeds[0])))
+    grids = [generate_ship(D, seed=s) for s in seeds]
+    # Compile every ship up front so the timed searches do not include it.
+    add("ship_graph", measure(ShipGraph, grids), peak=peak_memory(lambda: ShipGraph(grids[0])))
+    for grid in grids:
+        ship_graph(grid)
+
+    rng = random.Random(args.seed)
+    queries = [(grid, pair) for grid in grids for pair in open_pairs(grid, rng, args.queries)]
+    add("bfs_path",
+        measure(lambda x, st: bfs_path(x[0], x[1][0], x[1][1], stats=st), queries, True),
+        peak=peak_memory(lambda: bfs_path(queries[0][0], *queries[0][1])))
+
+    for q in q_values:
+        rng = random.Random(args.seed)
+        cases = []
+        for grid in grids:
+            fire_set = burned_fire(grid, q, rng, D // 2)
+            for start, goal in open_pairs(grid, rng, args.queries, fire_set):
+                cases.append((grid, start, goal, fire_set))
+        add("astar_path",
+            measure(lambda x, st: astar_path(*x, stats=st), cases, True), q,
+            peak=peak_memory(lambda: astar_path(*cases[0])))
+        add("fire_risk_map", measure(lambda x: fire_risk_map(x[0], x[3]), cases[::args.queries]), q)
+
+        # update_fire from growing fires: one sample per tick.
+        states = []
+        for grid in grids:
+            fire_set = {place_entities(grid, rng)[2]}
+            for _ in range(args.ticks):
+                states.append((grid, fire_set))
+                fire_set = update_fire(grid, fire_set, q, rng)
+        add("update_fire", measure(lambda x: update_fire(x[0], x[1], q, rng), states), q,
+            peak=peak_memory(lambda: update_fire(states[-1][0], states[-1][1], q, rng)))
+
+        for name in bot_names:
+            samples = []
+            for k, grid in enumerate(grids):
+                sim = Simulation(grid, BOTS[name], q, seed=args.seed + k)
+                move = sim.bot.next_move
+                def timed(bot_pos, fire_set):
+                    t = time.perf_counter()
+                    nxt = move(bot_pos, fire_set)
+                    samples.append(time.perf_counter() - t)
+                    return nxt
+                sim.bot.next_move = timed
+                while not sim.step() and sim.steps < args.max_steps:
+                    pass
+            add(f"{name}.next_move", percentiles(samples), q)
+    return rows
+
+def compare(rows, baseline_file, threshold):
+    """Prints every op whose p50 latency grew by more than 'threshold' (a fraction)."""
+    with open(baseline_file) as f:
+        baseline = {(r["op"], r["D"], r["q"]): r for r in json.load(f)["results"]}
+    regressions = 0
+    for row in rows:
+        old = baseline.get((row["op"], row["D"], row["q"]))
+        if old is None or old["p50_ms"] <= 0:
+            continue
+        ratio = row["p50_ms"] / old["p50_ms"]
+        flag = "REGRESSION" if ratio > 1 + threshold else ""
+        regressions += bool(flag)
+        print(f"{row['op']:<18} D={row['D']:<5} q={row['q']!s:<5} "
+              f"{old['p50_ms']:9.3f} -> {row['p50_ms']:9.3f} ms  x{ratio:5.2f} {flag}")
+    return regressions
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the fire simulation code")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES,
+                        help="ship sizes (default 50 100 200 500 1000)")
+    parser.add_argument("--q", type=float, nargs="+", default=Q_VALUES,
+                        help="flammability values (default 0.1 0.3 0.6)")
+    parser.add_argument("--bots", nargs="+", choices=list(BOTS), default=list(BOTS),
+                        help="bots whose next_move is timed (default all)")
+    parser.add_argument("--ships", type=int, default=3, help="ships per size (default 3)")
+    parser.add_argument("--queries", type=int, default=20,
+                        help="path queries per ship (default 20)")
+    parser.add_argument("--ticks", type=int, default=50,
+                        help="fire ticks per ship for update_fire (default 50)")
+    parser.add_argument("--max-steps", type=int, default=100,
+                        help="bot steps per run (default 100)")
+    parser.add_argument("--seed", type=int, default=0, help="base seed (default 0)")
+    parser.add_argument("--out", default="benchmark.json", help="results file")
+    parser.add_argument("--compare", metavar="FILE", default=None,
+                        help="compare p50 latencies against an earlier results file")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative slowdown reported as a regression (default 0.2)")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    rows = []
+    for D in args.sizes:
+        print(f"[benchmark] D={D}", file=sys.stderr)
+        rows.extend(bench_size(D, args.q, args.bots, args))
+    meta = {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "numpy": project.np is not None,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "args": vars(args),
+    }
+    with open(args.out, "w") as f:
+        json.dump({"meta": meta, "results": rows}, f, indent=1)
+    print(f"[benchmark] wrote {len(rows)} results to {args.out}", file=sys.stderr)
+    if args.compare and compare(rows, args.compare, args.threshold):
+        sys.exit(1)
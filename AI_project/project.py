@@ -1,15 +1,33 @@
 
 import random
 import heapq
-from collections import deque
-import pygame
+from collections import deque, namedtuple
+from contextlib import contextmanager
 import sys
+import argparse
+import hashlib
+import os
+import time
+import struct
+from array import array
+import zlib
+import json
+import mmap
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; only the array-backed representation needs it
+    np = None
+
+# pygame is only needed by the UI. It is imported by _import_pygame() when the UI
+# starts, so headless runs never touch a display.
+pygame = None
 
 #############################
 # Maze (Ship) Generation
 #############################
 
-def generate_ship(D):
+def generate_ship(D, seed=None, frontier=True):
     """
     Generates a D x D maze representing the ship.
     Cells with 1 are open and cells with 0 are blocked.
@@ -21,30 +39,24 @@ def generate_ship(D):
          Randomly pick one such cell and open it.
       4. Then, for each dead-end (open cell with one open neighbor), with 50% probability,
          open one of its closed neighbors.
+
+    With frontier=True (the default) step 3 keeps a live list of candidate cells and
+    only updates it around each newly opened cell, instead of rescanning the whole
+    grid every iteration. Both modes pick uniformly among the same candidates, so they
+    produce the same distribution of ships. Pass a seed to make generation repeatable.
     """
+    rng = random.Random(seed) if seed is not None else random
     grid = [[0 for _ in range(D)] for _ in range(D)]
     # Pick a random interior cell (avoid the border)
-    start_i = random.randint(1, D - 2)
-    start_j = random.randint(1, D - 2)
+    start_i = rng.randint(1, D - 2)
+    start_j = rng.randint(1, D - 2)
     grid[start_i][start_j] = 1
 
     # Iteratively open blocked cells with exactly one open neighbor.
-    while True:
-        candidates = []
-        for i in range(1, D - 1):
-            for j in range(1, D - 1):
-                if grid[i][j] == 0:
-                    open_neighbors = 0
-                    for di, dj in [(1, 0), (-1, 0), (0, 1), (0, -1)]:
-                        ni, nj = i + di, j + dj
-                        if grid[ni][nj] == 1:
-                            open_neighbors += 1
-                    if open_neighbors == 1:
-                        candidates.append((i, j))
-        if not candidates:
-            break
-        cell = random.choice(candidates)
-        grid[cell[0]][cell[1]] = 1
+    if frontier:
+        _open_by_frontier(grid, (start_i, start_j), rng)
+    else:
+        _open_by_scan(grid, rng)
 
     # Open some dead ends: for each open dead end (only one open neighbor),
     # with 50% probability, open one of its closed neighbors.
@@ -60,7 +72,7 @@ def generate_ship(D):
                 if len(open_nbrs) == 1:
                     dead_ends.append((i, j))
     for cell in dead_ends:
-        if random.random() < 0.5:
+        if rng.random() < 0.5:
             neighbors = []
             i, j = cell
             for di, dj in [(1, 0), (-1, 0), (0, 1), (0, -1)]:
@@ -68,10 +80,82 @@ def generate_ship(D):
                 if 0 <= ni < D and 0 <= nj < D and grid[ni][nj] == 0:
                     neighbors.append((ni, nj))
             if neighbors:
-                new_cell = random.choice(neighbors)
+                new_cell = rng.choice(neighbors)
                 grid[new_cell[0]][new_cell[1]] = 1
     return grid
 
+def _open_by_scan(grid, rng):
+    """Reference version of step 3: rescans every interior cell on each iteration."""
+    D = len(grid)
+    while True:
+        candidates = []
+        for i in range(1, D - 1):
+            for j in range(1, D - 1):
+                if grid[i][j] == 0:
+                    open_neighbors = 0
+                    for di, dj in [(1, 0), (-1, 0), (0, 1), (0, -1)]:
+                        ni, nj = i + di, j + dj
+                        if grid[ni][nj] == 1:
+                            open_neighbors += 1
+                    if open_neighbors == 1:
+                        candidates.append((i, j))
+        if not candidates:
+            break
+        cell = rng.choice(candidates)
+        grid[cell[0]][cell[1]] = 1
+
+def _open_by_frontier(grid, start, rng):
+    """
+    Incremental version of step 3.
+    Cells are flat ids (i * D + j). open_nbrs[c] counts the open neighbors of c, and
+    'candidates' holds every blocked interior cell whose count is exactly one, with
+    'slot' giving each candidate's index so it can be removed in O(1).
+    Opening a cell only touches its four neighbors.
+    """
+    D = len(grid)
+    is_open = bytearray(D * D)
+    interior = bytearray(D * D)
+    for i in range(1, D - 1):
+        interior[i * D + 1:i * D + D - 1] = b"\x01" * (D - 2)
+    open_nbrs = bytearray(D * D)
+    slot = [-1] * (D * D)
+    candidates = []
+    offsets = (D, -D, 1, -1)
+
+    def add(c):
+        slot[c] = len(candidates)
+        candidates.append(c)
+
+    def remove(c):
+        # Swap the last candidate into c's slot.
+        k = slot[c]
+        last = candidates.pop()
+        if last != c:
+            candidates[k] = last
+            slot[last] = k
+        slot[c] = -1
+
+    cell = start[0] * D + start[1]
+    while True:
+        is_open[cell] = 1
+        # Only interior cells are ever opened, so all four neighbors are in bounds.
+        for off in offsets:
+            n = cell + off
+            open_nbrs[n] += 1
+            if interior[n] and not is_open[n]:
+                if open_nbrs[n] == 1:
+                    add(n)
+                elif open_nbrs[n] == 2:
+                    remove(n)
+        if not candidates:
+            break
+        cell = candidates[rng.randrange(len(candidates))]
+        remove(cell)
+
+    for c in range(D * D):
+        if is_open[c]:
+            grid[c // D][c % D] = 1
+
 def get_neighbors(pos, grid):
     """Return adjacent open neighbors (up/down/left/right) for a given position."""
     D = len(grid)
@@ -83,122 +167,1067 @@ def get_neighbors(pos, grid):
             nbrs.append((ni, nj))
     return nbrs
 
+#############################
+# Compiled Ship Graph
+#############################
+
+class ShipGraph:
+    """
+    A ship compiled once into integer cell ids (i * D + j) and a compressed adjacency
+    (CSR) list, so search and fire code can work on ints instead of tuples:
+      - offsets, targets: u's open neighbors, in get_neighbors order, are
+        targets[offsets[u]:offsets[u + 1]]. Both are array('i'), about 4 bytes per
+        cell plus 4 per edge, so a D=1000 ship takes ~20 MB instead of the ~150 MB
+        of a list of tuples.
+      - open: 1 for open cells, 0 for blocked ones.
+    Ships are treated as immutable once compiled.
+    """
+    def __init__(self, grid):
+        self.D = D = len(grid)
+        n = D * D
+        is_open = self.open = bytearray(n)
+        for i in range(D):
+            row = grid[i]
+            for j in range(D):
+                if row[j] == 1:
+                    is_open[i * D + j] = 1
+        if np is not None:
+            offsets, targets = self._compile_numpy(is_open, D)
+        else:
+            offsets, targets = self._compile(is_open, D)
+        self.offsets = offsets
+        self.targets = targets
+        self.buffers = None
+        self.fields = {}  # goal frozenset -> unblocked distances, see base_field
+
+    @staticmethod
+    def _compile(is_open, D):
+        offsets = array("i", bytes(4 * (D * D + 1)))
+        targets = array("i")
+        add = targets.append
+        u = 0
+        for i in range(D):
+            down, up = i + 1 < D, i > 0
+            for j in range(D):
+                if down and is_open[u + D]:
+                    add(u + D)
+                if up and is_open[u - D]:
+                    add(u - D)
+                if j + 1 < D and is_open[u + 1]:
+                    add(u + 1)
+                if j > 0 and is_open[u - 1]:
+                    add(u - 1)
+                u += 1
+                offsets[u] = len(targets)
+        return offsets, targets
+
+    @staticmethod
+    def _compile_numpy(is_open, D):
+        # The same arrays as _compile, built a direction at a time.
+        o = np.frombuffer(bytes(is_open), dtype=np.uint8).reshape(D, D).astype(bool)
+        ids = np.arange(D * D, dtype=np.int32).reshape(D, D)
+        nbrs = np.zeros((D, D, 4), dtype=np.int32)
+        valid = np.zeros((D, D, 4), dtype=bool)
+        for k, (di, dj) in enumerate(((1, 0), (-1, 0), (0, 1), (0, -1))):
+            # Cells [rows, cols] have their neighbor in direction k at [to_rows, to_cols].
+            rows = slice(max(-di, 0), D + min(-di, 0))
+            cols = slice(max(-dj, 0), D + min(-dj, 0))
+            to_rows = slice(max(di, 0), D + min(di, 0))
+            to_cols = slice(max(dj, 0), D + min(dj, 0))
+            valid[rows, cols, k] = o[to_rows, to_cols]
+            nbrs[rows, cols, k] = ids[to_rows, to_cols]
+        counts = np.zeros(D * D + 1, dtype=np.int32)
+        np.cumsum(valid.sum(axis=2).ravel(), out=counts[1:])
+        return array("i", counts.tobytes()), array("i", nbrs[valid].tobytes())
+
+    def degree(self, u):
+        """Number of open neighbors of cell id u."""
+        return self.offsets[u + 1] - self.offsets[u]
+
+    def cells(self):
+        """Cells held by the graph and its cached fields, the unit of the graph cache."""
+        return self.D * self.D * (1 + len(self.fields))
+
+    def base_field(self, goals):
+        """
+        Unblocked BFS distances to a frozenset of goal cells, cached for the last
+        few goal sets (up to _BASE_FIELD_CELLS cells) so that trials with the same
+        button share one BFS. Callers copy the list before changing it.
+        """
+        dist = self.fields.pop(goals, None)
+        if dist is None:
+            dist = _bfs_distances(self, goals, ())
+            if _STATS is not None:
+                _STATS.add("field_builds")
+            if self.fields and (len(self.fields) + 1) * len(dist) > _BASE_FIELD_CELLS:
+                del self.fields[next(iter(self.fields))]
+        self.fields[goals] = dist  # most recently used last
+        return dist
+
+    def search_buffers(self):
+        """The ship's SearchBuffers, allocated on first use."""
+        if self.buffers is None:
+            self.buffers = SearchBuffers(self.D * self.D)
+        return self.buffers
+
+    def cell_id(self, pos):
+        return pos[0] * self.D + pos[1]
+
+    def cell(self, u):
+        return divmod(u, self.D)
+
+    def ids(self, cells):
+        """Set of ids for an iterable of (i, j) cells."""
+        D = self.D
+        return {i * D + j for i, j in cells}
+
+_BASE_FIELD_CELLS = 1000000  # cells of unblocked distance fields kept per ShipGraph
+
+_SHIP_GRAPHS = {}  # id(grid) -> (grid, ShipGraph); holding the grid keeps its id unique
+_SHIP_GRAPH_CELLS = 4000000  # budget of ShipGraph.cells() over all cached graphs
+
+def ship_graph(grid):
+    """
+    Returns the compiled ShipGraph of a ship, compiling it on first use. The least
+    recently used graphs are dropped once the cache holds more than
+    _SHIP_GRAPH_CELLS cells, so a few large ships or many small ones fit.
+    """
+    key = id(grid)
+    entry = _SHIP_GRAPHS.get(key)
+    if entry is not None and entry[0] is grid:
+        graph = entry[1]
+        if next(reversed(_SHIP_GRAPHS)) != key:
+            _SHIP_GRAPHS[key] = _SHIP_GRAPHS.pop(key)  # most recently used last
+        return graph
+    _SHIP_GRAPHS.pop(key, None)
+    graph = ShipGraph(grid)
+    total = graph.cells() + sum(g.cells() for _, g in _SHIP_GRAPHS.values())
+    while _SHIP_GRAPHS and total > _SHIP_GRAPH_CELLS:
+        total -= _SHIP_GRAPHS.pop(next(iter(_SHIP_GRAPHS)))[1].cells()
+    _SHIP_GRAPHS[key] = (grid, graph)
+    return graph
+
+#############################
+# Instrumentation
+#############################
+
+class Stats(dict):
+    """
+    Instrumentation counters and phase timers for one run (or many, after merge()).
+    Counters are the dict items, e.g. stats["astar_expansions"]; 'phases' maps a
+    phase name ("plan", "move", "spread", "render") to [seconds, calls].
+    Collected counters:
+      - bfs_expansions, astar_expansions, astar_pushes, dstar_expansions: cells
+        expanded (and heap pushes) by bfs_path, astar_path and IncrementalPlanner.
+      - paths, path_length: paths returned by bfs_path/astar_path and their total length.
+      - field_builds, field_repairs, field_invalidated: DistanceField BFS builds,
+        block() repairs and cells invalidated by those repairs.
+      - fire_ticks, fire_cells_visited: FireSpread ticks and frontier cells visited.
+    Nothing is counted unless a Stats is active (see collecting()), so instrumentation
+    costs one global lookup per call when it is off.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.phases = {}
+
+    def add(self, key, n=1):
+        self[key] = self.get(key, 0) + n
+
+    def add_time(self, phase, seconds):
+        entry = self.phases.get(phase)
+        if entry is None:
+            entry = self.phases[phase] = [0.0, 0]
+        entry[0] += seconds
+        entry[1] += 1
+
+    def merge(self, other):
+        """Adds another Stats' counters and phase times to this one."""
+        for key, n in other.items():
+            self.add(key, n)
+        for phase, (seconds, calls) in other.phases.items():
+            entry = self.phases.setdefault(phase, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += calls
+        return self
+
+    def to_dict(self):
+        return {"counters": dict(self),
+                "phases": {phase: {"seconds": seconds, "calls": calls}
+                           for phase, (seconds, calls) in self.phases.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls(data["counters"])
+        for phase, entry in data["phases"].items():
+            stats.phases[phase] = [entry["seconds"], entry["calls"]]
+        return stats
+
+    def dump(self, filename):
+        """Writes the stats as JSON."""
+        with open(filename, "w") as f:
+            json.dump(self.to_dict(), f, indent=1, sort_keys=True)
+
+    def report(self):
+        """Human-readable summary: phase times, then counters."""
+        lines = []
+        total = sum(seconds for seconds, _ in self.phases.values())
+        for phase, (seconds, calls) in sorted(self.phases.items(), key=lambda p: -p[1][0]):
+            share = seconds / total if total else 0.0
+            lines.append(f"{phase:<8} {seconds:10.3f} s {share:7.1%} {calls:>10} calls "
+                         f"{seconds / calls * 1e6:10.1f} us/call")
+        for key in sorted(self):
+            lines.append(f"{key:<20} {self[key]:>14}")
+        return "\n".join(lines)
+
+_STATS = None  # the active Stats, or None when instrumentation is off
+
+def set_stats(stats):
+    """Makes 'stats' (or None) the active Stats. Returns the previously active one."""
+    global _STATS
+    previous, _STATS = _STATS, stats
+    return previous
+
+@contextmanager
+def collecting(stats=None):
+    """Context manager that collects into 'stats' (a new Stats by default) and yields it."""
+    stats = Stats() if stats is None else stats
+    previous = set_stats(stats)
+    try:
+        yield stats
+    finally:
+        set_stats(previous)
+
 #############################
 # Path Planning Algorithms
 #############################
 
-def bfs_path(grid, start, goal, obstacles=set()):
+INF = float("inf")
+NEVER = 2 ** 31 - 1  # int stand-in for "never" in integer tick arrays
+
+class SearchBuffers:
+    """
+    Scratch arrays for the searches on one ship, allocated once and reused by every
+    search. Nothing is cleared between searches: each one takes fresh stamp values
+    from the generation counter, and any older stamp means unvisited. In the
+    bidirectional BFS stamp[u] == gen means u was reached from the start, gen + 1
+    from the goal and gen + 2 that u is blocked; in astar_path gen means u has a
+    score and gen + 1 that it is closed, with depth[u] holding its g score.
+    parent[u] and depth[u] are only valid while stamp[u] is current.
+    """
+    def __init__(self, n):
+        self.stamp = [0] * n
+        self.parent = [0] * n
+        self.depth = [0] * n
+        self.generation = 0
+
+    def next_generation(self):
+        self.generation += 3
+        return self.generation
+
+def _bidirectional_bfs(graph, s, t, obstacles):
+    """
+    Breadth-first search from cell ids s and t at the same time, always growing the
+    side with the smaller frontier by one whole level. Returns (meeting, expanded):
+    meeting is the edge (u, v) where a shortest path crosses from the start's tree
+    (u) to the goal's tree (v), or None if t cannot be reached from s (s != t).
+    """
+    buffers = graph.search_buffers()
+    stamp, parent, depth = buffers.stamp, buffers.parent, buffers.depth
+    fwd = buffers.next_generation()
+    bwd, blk = fwd + 1, fwd + 2
+    D = graph.D
+    for i, j in obstacles:
+        stamp[i * D + j] = blk
+    if stamp[t] == blk:
+        return None, 0
+    stamp[s], parent[s], depth[s] = fwd, -1, 0
+    stamp[t], parent[t], depth[t] = bwd, -1, 0
+    offsets, targets = graph.offsets, graph.targets
+    front_s, front_t = [s], [t]
+    expanded = 0
+    while front_s and front_t:
+        forward = len(front_s) <= len(front_t)
+        if forward:
+            frontier, own, other = front_s, fwd, bwd
+        else:
+            frontier, own, other = front_t, bwd, fwd
+        grown = []
+        best, best_len = None, INF
+        for u in frontier:
+            expanded += 1
+            du = depth[u] + 1
+            for v in targets[offsets[u]:offsets[u + 1]]:
+                tag = stamp[v]
+                if tag == own or tag == blk:
+                    continue
+                if tag == other:
+                    # The trees touch; finish the level and keep the shortest crossing.
+                    if du + depth[v] < best_len:
+                        best_len = du + depth[v]
+                        best = (u, v) if forward else (v, u)
+                    continue
+                stamp[v], parent[v], depth[v] = own, u, du
+                grown.append(v)
+        if best is not None:
+            return best, expanded
+        if forward:
+            front_s = grown
+        else:
+            front_t = grown
+    return None, expanded
+
+def bfs_path(grid, start, goal, obstacles=set(), stats=None):
     """
     Uses Breadth-First Search (BFS) to find a shortest path from start to goal.
     'obstacles' is a set of positions that cannot be traversed.
     Returns a list of positions (from start to goal) if a path is found, else None.
+    The search runs from both ends at once (see _bidirectional_bfs) and stops as soon
+    as the two trees meet, using the ship's preallocated SearchBuffers.
+    Expanded cells and the path length are counted into 'stats' (a Stats or plain
+    dict), or into the active Stats when it is None.
     """
-    queue = deque([start])
-    came_from = {start: None}
-    while queue:
-        current = queue.popleft()
-        if current == goal:
-            break
-        for nbr in get_neighbors(current, grid):
-            if nbr in obstacles:
-                continue
-            if nbr not in came_from:
-                came_from[nbr] = current
-                queue.append(nbr)
-    if goal not in came_from:
+    if stats is None:
+        stats = _STATS
+    graph = ship_graph(grid)
+    s, t = graph.cell_id(start), graph.cell_id(goal)
+    if s == t:
+        return [start]
+    meeting, expanded = _bidirectional_bfs(graph, s, t, obstacles)
+    if meeting is None:
+        if stats is not None:
+            _count_search(stats, "bfs", expanded, None, None)
         return None
-    # Reconstruct path
-    path = []
-    cur = goal
-    while cur is not None:
-        path.append(cur)
-        cur = came_from[cur]
-    path.reverse()
+    # Reconstruct path: start .. u from the start's tree, then v .. goal from the goal's.
+    parent = graph.search_buffers().parent
+    head = []
+    cur, tail_cur = meeting
+    while cur != -1:
+        head.append(cur)
+        cur = parent[cur]
+    head.reverse()
+    cur = tail_cur
+    while cur != -1:
+        head.append(cur)
+        cur = parent[cur]
+    D = graph.D
+    path = [divmod(u, D) for u in head]
+    if stats is not None:
+        _count_search(stats, "bfs", expanded, None, len(path))
     return path
 
-def astar_path(grid, start, goal, fire_set, risk_weight=5):
+def path_exists(grid, start, goal, obstacles=set(), stats=None):
+    """
+    Whether bfs_path would find a path, without building it. The bidirectional search
+    stops at the first contact, so a bot that is cut off is detected after exploring
+    only the smaller of its and the goal's regions.
+    """
+    if stats is None:
+        stats = _STATS
+    graph = ship_graph(grid)
+    s, t = graph.cell_id(start), graph.cell_id(goal)
+    if s == t:
+        return True
+    meeting, expanded = _bidirectional_bfs(graph, s, t, obstacles)
+    if stats is not None:
+        _count_search(stats, "bfs", expanded, None, None)
+    return meeting is not None
+
+def fire_risk_map(grid, fire_set, risk_weight=5):
+    """
+    Per-cell step cost penalty for A*, indexed by cell id: risk_weight for each
+    burning neighbor, and INF for cells that are burning themselves (impassable).
+    Computed once per tick from the fire state.
+    """
+    graph = ship_graph(grid)
+    offsets, targets = graph.offsets, graph.targets
+    risk = [0] * (graph.D * graph.D)
+    fire = graph.ids(fire_set)
+    for u in fire:
+        for v in targets[offsets[u]:offsets[u + 1]]:
+            risk[v] += risk_weight
+    for u in fire:
+        risk[u] = INF
+    return risk
+
+def _sparse_fire_risk(graph, fire_set, risk_weight):
+    """fire_risk_map as a dict holding only the cells next to or on fire (others are 0)."""
+    offsets, targets = graph.offsets, graph.targets
+    risk = {}
+    fire = graph.ids(fire_set)
+    for u in fire:
+        for v in targets[offsets[u]:offsets[u + 1]]:
+            risk[v] = risk.get(v, 0) + risk_weight
+    for u in fire:
+        risk[u] = INF
+    return risk
+
+def astar_path(grid, start, goal, fire_set, risk_weight=5, risk=None, stats=None):
     """
     Uses A* search to find a path from start to goal.
     Instead of completely blocking fire cells, this function penalizes cells that are
     adjacent to fire (using risk_weight). Cells that are on fire are treated as blocked.
-    """
-    def neighbors(pos):
-        return get_neighbors(pos, grid)
 
-    def cost(current, neighbor):
-        # Base cost 1 plus penalty for being adjacent to fire.
-        risk = 0
-        for di, dj in [(1, 0), (-1, 0), (0, 1), (0, -1)]:
-            adj = (neighbor[0] + di, neighbor[1] + dj)
-            if adj in fire_set:
-                risk += risk_weight
-        return 1 + risk
-
-    def heuristic(pos):
-        # Manhattan distance as heuristic.
-        return abs(pos[0] - goal[0]) + abs(pos[1] - goal[1])
+    'risk' is an optional precomputed fire_risk_map; when given, fire_set and
+    risk_weight are not used, otherwise only the cells around the fire are scored.
+    Scores and parents live in the ship's SearchBuffers, so a call costs time in
+    proportion to the cells it touches rather than the ship size. Each cell is
+    expanded at most once, the search stops as soon as the goal is expanded, and
+    ties on f are broken toward the goal (smaller heuristic first).
+    Expanded cells, heap pushes and the path length are counted into 'stats' (a
+    Stats or plain dict), or into the active Stats when it is None.
+    """
+    if stats is None:
+        stats = _STATS
+    graph = ship_graph(grid)
+    offsets, targets, D = graph.offsets, graph.targets, graph.D
+    s, t = graph.cell_id(start), graph.cell_id(goal)
+    if s == t:
+        return [start]
+    if risk is None:
+        sparse = _sparse_fire_risk(graph, fire_set, risk_weight)
+        risk_of = lambda u: sparse.get(u, 0)
+    else:
+        risk_of = risk.__getitem__
+    if risk_of(t) == INF:
+        return None
+    ti, tj = goal
 
-    open_set = []
-    heapq.heappush(open_set, (heuristic(start), 0, start))
-    came_from = {start: None}
-    g_score = {start: 0}
+    buffers = graph.search_buffers()
+    stamp, came_from, g_score = buffers.stamp, buffers.parent, buffers.depth
+    seen = buffers.next_generation()
+    closed = seen + 1
+    stamp[s], came_from[s], g_score[s] = seen, -1, 0
+    h = abs(start[0] - ti) + abs(start[1] - tj)
+    open_set = [(h, h, s)]  # (f, h, cell)
+    pushes = 1
+    expanded = 0
 
     while open_set:
-        _, current_g, current = heapq.heappop(open_set)
-        if current == goal:
+        _, _, current = heapq.heappop(open_set)
+        if stamp[current] == closed:
+            continue  # stale entry
+        if current == t:
             path = []
-            while current is not None:
-                path.append(current)
+            while current != -1:
+                path.append(graph.cell(current))
                 current = came_from[current]
             path.reverse()
+            if stats is not None:
+                _count_search(stats, "astar", expanded + 1, pushes, len(path))
             return path
-        for nbr in neighbors(current):
-            if nbr in fire_set:  # treat on-fire cells as blocked
+        stamp[current] = closed
+        expanded += 1
+        base = g_score[current] + 1
+        for nbr in targets[offsets[current]:offsets[current + 1]]:
+            tag = stamp[nbr]
+            if tag == closed:
+                continue
+            tentative_g = base + risk_of(nbr)  # INF for on-fire cells
+            if tentative_g == INF:
                 continue
-            tentative_g = g_score[current] + cost(current, nbr)
-            if nbr not in g_score or tentative_g < g_score[nbr]:
-                came_from[nbr] = current
-                g_score[nbr] = tentative_g
-                heapq.heappush(open_set, (tentative_g + heuristic(nbr), tentative_g, nbr))
+            if tag != seen or tentative_g < g_score[nbr]:
+                stamp[nbr], came_from[nbr], g_score[nbr] = seen, current, tentative_g
+                # Manhattan distance as heuristic.
+                h = abs(nbr // D - ti) + abs(nbr % D - tj)
+                heapq.heappush(open_set, (tentative_g + h, h, nbr))
+                pushes += 1
+    if stats is not None:
+        _count_search(stats, "astar", expanded, pushes, None)
     return None
 
+def _count_search(stats, name, expanded, pushes, path_length):
+    """Adds one search's counters to a Stats or plain dict."""
+    key = name + "_expansions"
+    stats[key] = stats.get(key, 0) + expanded
+    if pushes is not None:
+        key = name + "_pushes"
+        stats[key] = stats.get(key, 0) + pushes
+    if path_length:
+        stats["paths"] = stats.get("paths", 0) + 1
+        stats["path_length"] = stats.get("path_length", 0) + path_length
+
+class IncrementalPlanner:
+    """
+    D* Lite planner toward a fixed goal for a bot whose set of blocked cells only grows.
+    It searches backward from the goal, so the search tree stays valid when the bot
+    moves, and block() only repairs the part of the tree that went through newly
+    blocked cells. Each next_move() call then does work proportional to what changed
+    instead of a full BFS. Cells are flat ids (i * D + j); every step costs 1 and
+    stepping onto a blocked cell is not allowed, as in bfs_path.
+    """
+    def __init__(self, grid, goal):
+        self.grid = grid
+        self.D = len(grid)
+        graph = ship_graph(grid)
+        self.offsets, self.targets = graph.offsets, graph.targets
+        self.goal = goal[0] * self.D + goal[1]
+        self.g = {}      # cost-to-goal estimates (missing = infinity)
+        self.rhs = {self.goal: 0}
+        self.blocked = set()
+        self.queue = []  # heap of (k1, k2, id), with stale entries skipped
+        self.keys = {}   # id -> key of its live queue entry
+        self.km = 0
+        self.start = None
+
+    def _h(self, u):
+        # Manhattan distance to the bot, the D* Lite heuristic.
+        D = self.D
+        return abs(u // D - self.start // D) + abs(u % D - self.start % D)
+
+    def _key(self, u):
+        m = min(self.g.get(u, INF), self.rhs.get(u, INF))
+        return (m + self._h(u) + self.km, m)
+
+    def _update_vertex(self, u):
+        g = self.g
+        if u != self.goal:
+            best, offsets, blocked = INF, self.offsets, self.blocked
+            for v in self.targets[offsets[u]:offsets[u + 1]]:
+                if v not in blocked:
+                    cost = g.get(v, INF) + 1
+                    if cost < best:
+                        best = cost
+            self.rhs[u] = best
+        self.keys.pop(u, None)
+        if g.get(u, INF) != self.rhs.get(u, INF):
+            key = self._key(u)
+            self.keys[u] = key
+            heapq.heappush(self.queue, (key[0], key[1], u))
+
+    def _top_key(self):
+        queue, keys = self.queue, self.keys
+        while queue:
+            k1, k2, u = queue[0]
+            if keys.get(u) == (k1, k2):
+                return (k1, k2)
+            heapq.heappop(queue)
+        return (INF, INF)
+
+    def _compute_shortest_path(self):
+        g, rhs, keys = self.g, self.rhs, self.keys
+        offsets, targets = self.offsets, self.targets
+        s = self.start
+        expanded = 0
+        while (self._top_key() < self._key(s)
+               or g.get(s, INF) != rhs.get(s, INF)):
+            k1, k2, u = heapq.heappop(self.queue)
+            if keys.get(u) != (k1, k2):
+                continue
+            expanded += 1
+            k_new = self._key(u)
+            if (k1, k2) < k_new:
+                keys[u] = k_new
+                heapq.heappush(self.queue, (k_new[0], k_new[1], u))
+            elif g.get(u, INF) > rhs.get(u, INF):
+                g[u] = rhs[u]
+                del keys[u]
+                for p in targets[offsets[u]:offsets[u + 1]]:
+                    self._update_vertex(p)
+            else:
+                g[u] = INF
+                self._update_vertex(u)
+                for p in targets[offsets[u]:offsets[u + 1]]:
+                    self._update_vertex(p)
+        if _STATS is not None:
+            _STATS.add("dstar_expansions", expanded)
+
+    def block(self, cells):
+        """Marks cells as impassable and repairs the search tree around them."""
+        D = self.D
+        for i, j in cells:
+            v = i * D + j
+            if v in self.blocked:
+                continue
+            self.blocked.add(v)
+            if self.start is not None:
+                for p in self.targets[self.offsets[v]:self.offsets[v + 1]]:
+                    self._update_vertex(p)
+
+    def next_move(self, pos):
+        """
+        Returns the neighbor of pos to move to next, pos itself if it is the goal,
+        or None if the goal cannot be reached.
+        """
+        s = pos[0] * self.D + pos[1]
+        if s == self.goal:
+            return pos
+        if self.start is None:
+            self.start = s
+            self._update_vertex(self.goal)
+        else:
+            self.km += self._h(s)
+            self.start = s
+        self._compute_shortest_path()
+        if self.g.get(s, INF) == INF:
+            return None
+        best, move = INF, None
+        for v in self.targets[self.offsets[s]:self.offsets[s + 1]]:
+            if v not in self.blocked:
+                cost = self.g.get(v, INF) + 1
+                if cost < best:
+                    best, move = cost, v
+        return None if move is None else divmod(move, self.D)
+
+# DistanceFields starting with at most this many blocked cells are copied from the
+# ship's cached unblocked field and repaired instead of running a full BFS.
+_BLOCKS_ON_BASE_FIELD = 64
+
+def _bfs_distances(graph, goals, blocked):
+    """BFS distance from the nearest goal for every cell id, avoiding blocked ids."""
+    offsets, targets, D = graph.offsets, graph.targets, graph.D
+    dist = [INF] * (D * D)
+    queue = deque()
+    for i, j in goals:
+        g = i * D + j
+        if g not in blocked:
+            dist[g] = 0
+            queue.append(g)
+    while queue:
+        u = queue.popleft()
+        d = dist[u] + 1
+        for v in targets[offsets[u]:offsets[u + 1]]:
+            if dist[v] == INF and v not in blocked:
+                dist[v] = d
+                queue.append(v)
+    return dist
+
+class DistanceField:
+    """
+    Distance to the goal from every cell, computed once by a reverse BFS from the goal
+    over open, unblocked cells. A bot's next move is then a lookup: the neighbor with
+    the lowest distance (first in get_neighbors order on ties). This is always a
+    first step of some shortest path, but on ties it can differ from the first step
+    of bfs_path, whose bidirectional search picks among shortest paths differently.
+    block() updates the field locally: only cells that lost every shortest-path
+    parent are invalidated, and they are re-settled from the valid cells around them.
+    That repair waits until a lookup could see it, so ticks where the fire only
+    grows behind the bot cost no repair at all.
+    'version' counts the block() calls that changed the field.
+    'goal' may also be a frozenset of cells: the field then holds the distance to the
+    nearest of them (a multi-source BFS), so any number of bots heading for several
+    buttons share one field.
+    """
+    def __init__(self, grid, goal, blocked=()):
+        self.grid = grid
+        self.D = D = len(grid)
+        graph = ship_graph(grid)
+        self.graph = graph
+        self.offsets, self.targets = graph.offsets, graph.targets
+        self.goal = goal
+        self.goals = goal if isinstance(goal, frozenset) else frozenset([goal])
+        self.blocked = set()        # flat ids (i * D + j)
+        self.blocked_cells = set()  # the same cells as (i, j) tuples
+        self.version = 0
+        self._seeds = {}            # deferred repair: distance -> cells to recheck
+        self._pending = INF         # lowest distance among cells awaiting repair
+        blocked = list(blocked)
+        if len(blocked) <= _BLOCKS_ON_BASE_FIELD:
+            # Few blocked cells (a fresh trial): start from the ship's unblocked field
+            # for this goal, computed once per (ship, goal), and repair it.
+            self.dist = graph.base_field(self.goals)[:]
+            self.block(blocked)
+            self.version = 0
+            return
+        for i, j in blocked:
+            self.blocked.add(i * D + j)
+            self.blocked_cells.add((i, j))
+        self.dist = _bfs_distances(graph, self.goals, self.blocked)
+        if _STATS is not None:
+            _STATS.add("field_builds")
+
+    def block(self, cells):
+        """
+        Marks cells as impassable. Repairing the distances that depended on them is
+        deferred until a lookup could see the change (see _settle).
+        """
+        dist, blocked, D = self.dist, self.blocked, self.D
+        offsets, targets = self.offsets, self.targets
+        # Distances are small integers, so the repair uses bucket queues (cells by
+        # distance, processed in increasing order) instead of a heap.
+        buckets = self._seeds
+        changed = False
+        for i, j in cells:
+            v = i * D + j
+            if v in blocked:
+                continue
+            blocked.add(v)
+            self.blocked_cells.add((i, j))
+            dv = dist[v]
+            if dv != INF:
+                for w in targets[offsets[v]:offsets[v + 1]]:
+                    if dist[w] == dv + 1:
+                        buckets.setdefault(dv + 1, []).append(w)
+                dist[v] = INF
+                changed = True
+                if dv < self._pending:
+                    self._pending = dv
+        if changed:
+            self.version += 1
+
+    def _settle(self, d):
+        """
+        Applies the deferred repair if it could change a distance of d. Only cells
+        farther than the nearest newly blocked cell can lose their shortest path, so
+        while d is at most that distance the stale field is still exact.
+        """
+        if d > self._pending and d != INF:
+            self._repair()
+            return True
+        return False
+
+    def _repair(self):
+        dist, blocked = self.dist, self.blocked
+        offsets, targets = self.offsets, self.targets
+        buckets = self._seeds
+        self._seeds = {}
+        self._pending = INF
+
+        # Invalidate, in order of distance, every cell left without a valid parent.
+        # Blocked cells hold INF, so they never count as parents (nor are re-settled).
+        invalid = set()
+        d = min(buckets)
+        while buckets:
+            for w in buckets.pop(d, ()):
+                if w in invalid or w in blocked:
+                    continue
+                for u in targets[offsets[w]:offsets[w + 1]]:
+                    if dist[u] == d - 1 and u not in invalid:
+                        break
+                else:
+                    invalid.add(w)
+                    for x in targets[offsets[w]:offsets[w + 1]]:
+                        if dist[x] == d + 1:
+                            buckets.setdefault(d + 1, []).append(x)
+            d += 1
+
+        if _STATS is not None:
+            _STATS.add("field_repairs")
+            _STATS.add("field_invalidated", len(invalid))
+        if not invalid:
+            return
+
+        # Re-settle the invalidated cells from the valid cells around them.
+        for w in invalid:
+            dist[w] = INF
+        for w in invalid:
+            best = INF
+            for u in targets[offsets[w]:offsets[w + 1]]:
+                if dist[u] + 1 < best:
+                    best = dist[u] + 1
+            if best != INF:
+                dist[w] = best
+                buckets.setdefault(best, []).append(w)
+        if not buckets:
+            return
+        d = min(buckets)
+        while buckets:
+            for w in buckets.pop(d, ()):
+                if dist[w] != d:
+                    continue
+                for x in targets[offsets[w]:offsets[w + 1]]:
+                    if d + 1 < dist[x] and x in invalid:
+                        dist[x] = d + 1
+                        buckets.setdefault(d + 1, []).append(x)
+            d += 1
+
+    def distance(self, pos):
+        v = pos[0] * self.D + pos[1]
+        if self._seeds:
+            self._settle(self.dist[v])
+        return self.dist[v]
+
+    def next_move(self, pos):
+        """
+        Returns the neighbor of pos with the lowest distance, pos itself if it is a
+        goal, or None if no goal can be reached.
+        """
+        if pos in self.goals:
+            return pos
+        while True:
+            best, move = INF, None
+            for nbr in get_neighbors(pos, self.grid):
+                d = self.dist[nbr[0] * self.D + nbr[1]]
+                if d < best:
+                    best, move = d, nbr
+            # Distances can only grow in a repair, so the lowest neighbor stays
+            # lowest unless it is one of the cells the repair could change.
+            if not self._seeds or not self._settle(best):
+                return move
+
+class DistanceFieldCache:
+    """
+    Shares DistanceFields between bots, keyed on (ship, goal). get() brings the cached
+    field up to date with the current fire by blocking only the cells that are new
+    since the field was last used. If the fire is not a superset of what the field
+    has blocked (a different simulation on the same ship), the field is rebuilt.
+    That check is skipped when the fire is the same set object as on the previous
+    call, since a simulation's fire only grows; many bots sharing one fire then cost
+    O(1) each once the first of them has blocked the tick's new cells.
+    Ships are treated as immutable once generated. At most max_entries fields are kept.
+    """
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self.fields = {}  # (id(grid), goal) -> (grid, field, fire set of the last call)
+
+    def get(self, grid, goal, fire_set):
+        key = (id(grid), goal)
+        entry = self.fields.get(key)
+        field = entry[1] if entry is not None and entry[0] is grid else None
+        if field is not None:
+            if fire_set is entry[2]:
+                fresh = True
+            elif isinstance(fire_set, (set, frozenset)):
+                fresh = field.blocked_cells <= fire_set
+            else:
+                fresh = all(cell in fire_set for cell in field.blocked_cells)
+            if fresh:
+                if len(fire_set) != len(field.blocked_cells):
+                    field.block(_new_cells(fire_set, set(field.blocked_cells)))
+            else:
+                field = None
+        if field is None:
+            field = DistanceField(grid, goal, blocked=fire_set)
+            if key not in self.fields and len(self.fields) >= self.max_entries:
+                del self.fields[next(iter(self.fields))]
+        self.fields[key] = (grid, field, fire_set)
+        return field
+
+# Fields shared by every bot in this process.
+DISTANCE_FIELDS = DistanceFieldCache()
+
 #############################
 # Fire Spreading Function
 #############################
 
-def update_fire(grid, fire_set, q):
+def fire_probabilities(q):
+    """Ignition probability 1 - (1 - q)^K for K = 0..4 burning neighbors."""
+    return [1 - (1 - q) ** K for K in range(5)]
+
+class BurningSet(set):
+    """
+    The set of burning cells returned by update_fire. It also carries the fire's
+    frontier (every open cell bordering the fire, by cell id, mapped to its number
+    of burning neighbors K), so the next update_fire call continues from it instead
+    of rescanning the whole fire. Treat it as read-only; if its size changes,
+    update_fire recomputes the frontier from the cells.
+    """
+
+def update_fire(grid, fire_set, q, rng=None):
     """
     Updates the set of burning cells (fire_set) simultaneously.
     For each open cell that is not burning, count K = number of burning neighbors.
     That cell catches fire with probability 1 - (1 - q)^K.
+    'rng' is the random source (the random module by default).
+    Returns a new BurningSet; fire_set is not modified.
+
+    Random draws: one rng.random() per cell with K >= 1, in row-major order (the
+    order FireSpread and the array versions use as well). The original version
+    also drew a number for every open cell with K = 0, which can never ignite, so
+    the same seed gives a different (identically distributed) fire than it did.
+    When fire_set came from update_fire its frontier is reused, so apart from
+    copying the set the work per tick follows the fire's perimeter.
     """
-    D = len(grid)
-    new_fire = set(fire_set)  # start with cells already burning
-    for i in range(D):
-        for j in range(D):
-            if grid[i][j] == 1 and (i, j) not in fire_set:
-                K = 0
-                for di, dj in [(1, 0), (-1, 0), (0, 1), (0, -1)]:
-                    ni, nj = i + di, j + dj
-                    if 0 <= ni < D and 0 <= nj < D and (ni, nj) in fire_set:
-                        K += 1
-                # Compute probability to catch fire
-                prob = 1 - (1 - q) ** K
-                if random.random() < prob:
-                    new_fire.add((i, j))
+    rng = rng or random
+    prob = fire_probabilities(q)
+    graph = ship_graph(grid)
+    offsets, targets, D = graph.offsets, graph.targets, graph.D
+    if (isinstance(fire_set, BurningSet) and fire_set.graph is graph
+            and len(fire_set) == fire_set.size):
+        frontier = dict(fire_set.frontier)
+    else:
+        fire = graph.ids(fire_set)
+        frontier = {}
+        for u in fire:
+            for v in targets[offsets[u]:offsets[u + 1]]:
+                if v not in fire:
+                    frontier[v] = frontier.get(v, 0) + 1
+    new_fire = BurningSet(fire_set)  # start with cells already burning
+    new_ids = [v for v in sorted(frontier) if rng.random() < prob[frontier[v]]]
+    for v in new_ids:
+        new_fire.add(divmod(v, D))
+        del frontier[v]
+    for v in new_ids:
+        for w in targets[offsets[v]:offsets[v + 1]]:
+            if divmod(w, D) not in new_fire:
+                frontier[w] = frontier.get(w, 0) + 1
+    new_fire.graph, new_fire.frontier, new_fire.size = graph, frontier, len(new_fire)
     return new_fire
 
+class FireSpread:
+    """
+    Incremental version of update_fire that keeps its state between ticks.
+    'burning' is the set of burning cells and 'frontier' maps every open cell
+    bordering the fire (by cell id) to its number of burning neighbors K. Each tick
+    only the frontier is visited, and igniting a cell only updates its four
+    neighbors, so the per-tick cost follows the fire's perimeter instead of the
+    ship's area. Ignition probabilities and random draws are the same as
+    update_fire: a frontier cell catches fire with probability 1 - (1 - q)^K, using
+    the K from before the tick, with one draw per frontier cell in row-major order,
+    so both give the same fire from the same seed.
+    """
+    def __init__(self, grid, burning, q, rng=None):
+        self.grid = grid
+        self.graph = ship_graph(grid)
+        self.q = q
+        self.rng = rng or random
+        self.prob = fire_probabilities(q)
+        self.burning = set()
+        self.on_fire = bytearray(self.graph.D ** 2)
+        self.frontier = {}
+        self.ignite(burning)
+
+    def ignite(self, cells):
+        """Marks cells as burning and updates the neighbor counts around them."""
+        self._ignite_ids([self.graph.cell_id(cell) for cell in cells])
+
+    def _ignite_ids(self, ids):
+        offsets, targets = self.graph.offsets, self.graph.targets
+        on_fire, frontier = self.on_fire, self.frontier
+        D = self.graph.D
+        for u in ids:
+            if on_fire[u]:
+                continue
+            on_fire[u] = 1
+            self.burning.add(divmod(u, D))
+            frontier.pop(u, None)
+            for v in targets[offsets[u]:offsets[u + 1]]:
+                if not on_fire[v]:
+                    frontier[v] = frontier.get(v, 0) + 1
+
+    def spread(self):
+        """Advances the fire by one tick. Returns the list of newly ignited cells."""
+        prob = self.prob
+        rand = self.rng.random
+        if _STATS is not None:
+            _STATS.add("fire_ticks")
+            _STATS.add("fire_cells_visited", len(self.frontier))
+        frontier = self.frontier
+        new_ids = [v for v in sorted(frontier) if rand() < prob[frontier[v]]]
+        self._ignite_ids(new_ids)
+        D = self.graph.D
+        return [divmod(v, D) for v in new_ids]
+
+    def can_spread(self):
+        """False once the fire can never grow again."""
+        return self.q > 0 and bool(self.frontier)
+
+#############################
+# Array-backed Ship and Fire (NumPy)
+#############################
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("numpy is required for the array-backed ship representation")
+
+def ship_array(grid):
+    """Converts a list-of-lists ship into a D x D uint8 array (1 = open, 0 = blocked)."""
+    _require_numpy()
+    return np.asarray(grid, dtype=np.uint8)
+
+def burning_neighbor_counts(fire_mask):
+    """
+    Returns K, the number of burning 4-neighbors of every cell, as a uint8 array.
+    Computed by adding the fire mask shifted one cell in each direction. Any leading
+    axes are treated as independent fires, so (D, D) and (N, D, D) masks both work.
+    """
+    f = fire_mask.astype(np.uint8)
+    K = np.zeros_like(f)
+    K[..., 1:, :] += f[..., :-1, :]
+    K[..., :-1, :] += f[..., 1:, :]
+    K[..., :, 1:] += f[..., :, :-1]
+    K[..., :, :-1] += f[..., :, 1:]
+    return K
+
+def _ignition_draw(ship, fire_mask, q, rng):
+    """Flat indices of the cells that catch fire this tick (one vectorized draw)."""
+    K = burning_neighbor_counts(fire_mask)
+    candidates = np.flatnonzero((ship == 1) & ~fire_mask & (K > 0))
+    prob = np.asarray(fire_probabilities(q))[K.ravel()[candidates]]
+    return candidates[rng.random(candidates.size) < prob]
+
+def update_fire_array(ship, fire_mask, q, rng=None):
+    """
+    Array version of update_fire. 'ship' is a uint8 ship array and 'fire_mask' a
+    boolean array of the same shape. Returns the new fire mask.
+    Every open, non-burning cell with K burning neighbors ignites with probability
+    1 - (1 - q)^K, using one vectorized random draw for all candidate cells.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    ignited = _ignition_draw(ship, fire_mask, q, rng)
+    new_mask = fire_mask.copy()
+    new_mask.ravel()[ignited] = True
+    return new_mask
+
+class FireMask:
+    """
+    Read-only, set-like view of a boolean fire mask. It supports the operations the
+    bots and planners use on fire_set ('in', iteration, len, union), so they can run
+    on the array-backed fire without building a set of tuples.
+    """
+    def __init__(self, mask):
+        self.mask = mask
+
+    def __contains__(self, pos):
+        i, j = pos
+        rows, cols = self.mask.shape
+        return 0 <= i < rows and 0 <= j < cols and bool(self.mask[i, j])
+
+    def __iter__(self):
+        return map(tuple, np.argwhere(self.mask).tolist())
+
+    def __len__(self):
+        return int(np.count_nonzero(self.mask))
+
+    def union(self, other):
+        return set(self).union(other)
+
+class ArrayFireSpread:
+    """
+    Array-backed counterpart of FireSpread with the same interface: 'burning'
+    (a FireMask), ignite(), spread() and can_spread().
+    A tick is a shifted-array neighbor count plus one vectorized random draw, and
+    the state is a D x D boolean mask instead of a set of tuples.
+    'rng' is a numpy Generator.
+    """
+    def __init__(self, grid, burning, q, rng=None):
+        _require_numpy()
+        self.ship = grid if isinstance(grid, np.ndarray) else ship_array(grid)
+        self.q = q
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.mask = np.zeros(self.ship.shape, dtype=bool)
+        self.burning = FireMask(self.mask)
+        self.ignite(burning)
+
+    def ignite(self, cells):
+        for i, j in cells:
+            self.mask[i, j] = True
+
+    def spread(self):
+        """Advances the fire by one tick. Returns the list of newly ignited cells."""
+        ignited = _ignition_draw(self.ship, self.mask, self.q, self.rng)
+        self.mask.ravel()[ignited] = True
+        cols = self.mask.shape[1]
+        return [divmod(int(c), cols) for c in ignited]
+
+    def can_spread(self):
+        if self.q <= 0:
+            return False
+        K = burning_neighbor_counts(self.mask)
+        return bool(np.any((self.ship == 1) & ~self.mask & (K > 0)))
+
 #############################
 # Bot Strategies
 #############################
 
 # Bot 1: Plans the entire path (ignoring subsequent fire spread) once at t=0.
 class Bot1:
-    def __init__(self, grid, start, button, initial_fire):
+    def __init__(self, grid, start, button, initial_fire, fire_set=None):
         self.grid = grid
         self.button = button
-        # For planning, treat the initial fire cell as blocked.
-        self.path = bfs_path(grid, start, button, obstacles={initial_fire})
+        # For planning, treat the initial fire cell (or every cell of fire_set, when
+        # the fire starts from several origins) as blocked.
+        obstacles = {initial_fire} if fire_set is None else set(fire_set)
+        self.path = bfs_path(grid, start, button, obstacles=obstacles)
         if self.path is None:
             # If no path is found, the bot will simply stay in place.
             self.path = [start]
@@ -211,41 +1240,69 @@ class Bot1:
             return self.path[self.index]
         return bot_pos  # no move if already at the end
 
+def _new_cells(fire_set, seen):
+    """
+    Returns the cells of fire_set that are not in 'seen' yet and adds them to it.
+    The fire only grows, so an unchanged size means there is nothing new.
+    """
+    if len(fire_set) == len(seen):
+        return []
+    if isinstance(fire_set, (set, frozenset)):
+        new = fire_set - seen
+    else:
+        new = {cell for cell in fire_set if cell not in seen}
+    seen.update(new)
+    return new
+
 # Bot 2: Re-plans at every time step, avoiding current fire cells.
+# The plan is a shared distance field from the button that is repaired locally as the
+# fire spreads, so each step is a lookup of the lowest-distance neighbor.
 class Bot2:
-    def __init__(self, grid, button):
+    def __init__(self, grid, button, fields=None):
         self.grid = grid
         self.button = button
+        self.fields = fields if fields is not None else DISTANCE_FIELDS
 
     def next_move(self, bot_pos, fire_set):
-        path = bfs_path(self.grid, bot_pos, self.button, obstacles=fire_set)
-        if path is None or len(path) < 2:
+        move = self.fields.get(self.grid, self.button, fire_set).next_move(bot_pos)
+        if move is None:
             return bot_pos  # no valid move found; stay in place
-        return path[1]
+        return move
 
 # Bot 3: Re-plans at every time step, trying first to avoid both fire and cells adjacent to fire.
+# One incremental planner avoids fire and adjacent cells; the fallback planner avoids
+# only fire and is kept up to date but only searched when the first one finds no path.
 class Bot3:
     def __init__(self, grid, button):
         self.grid = grid
         self.button = button
+        self.cautious = IncrementalPlanner(grid, button)
+        self.fallback = IncrementalPlanner(grid, button)
+        self.seen_fire = set()
+        self.trapped_at = None  # position from which the button was found unreachable
 
     def next_move(self, bot_pos, fire_set):
-        # Compute cells adjacent to fire.
-        adj_to_fire = set()
-        for cell in fire_set:
-            for di, dj in [(1, 0), (-1, 0), (0, 1), (0, -1)]:
-                nbr = (cell[0] + di, cell[1] + dj)
-                if (0 <= nbr[0] < len(self.grid) and 0 <= nbr[1] < len(self.grid) and
-                    self.grid[nbr[0]][nbr[1]] == 1):
-                    adj_to_fire.add(nbr)
-        obstacles = fire_set.union(adj_to_fire)
-        path = bfs_path(self.grid, bot_pos, self.button, obstacles=obstacles)
-        if path is None:
-            # Fall back to planning that avoids only fire cells.
-            path = bfs_path(self.grid, bot_pos, self.button, obstacles=fire_set)
-        if path is None or len(path) < 2:
+        new_fire = _new_cells(fire_set, self.seen_fire)
+        # Newly burning cells plus the cells adjacent to them.
+        adj_to_fire = set(new_fire)
+        for cell in new_fire:
+            adj_to_fire.update(get_neighbors(cell, self.grid))
+        self.cautious.block(adj_to_fire)
+        self.fallback.block(new_fire)
+        if bot_pos == self.trapped_at:
+            return bot_pos  # the fire only grows, so a cut-off bot stays cut off
+        move = self.cautious.next_move(bot_pos)
+        if move is None:
+            # Fall back to planning that avoids only fire cells. A cheap reachability
+            # check first spares the fallback planner a search of the whole ship when
+            # the bot is cut off from the button.
+            if not path_exists(self.grid, bot_pos, self.button, fire_set):
+                self.trapped_at = bot_pos
+                return bot_pos
+            move = self.fallback.next_move(bot_pos)
+        if move is None:
             return bot_pos
-        return path[1]
+        return move
 
 # Bot 4: A custom bot that uses A* search with a cost that adds a risk penalty
 # for being adjacent to fire.
@@ -256,13 +1313,1361 @@ class Bot4:
         self.grid = grid
         self.button = button
         self.risk_weight = risk_weight
+        # Risk map kept up to date incrementally as cells catch fire.
+        self.graph = ship_graph(grid)
+        self.risk = [0] * (self.graph.D * self.graph.D)
+        self.seen_fire = set()
 
     def next_move(self, bot_pos, fire_set):
-        path = astar_path(self.grid, bot_pos, self.button, fire_set, self.risk_weight)
+        offsets, targets, risk = self.graph.offsets, self.graph.targets, self.risk
+        for cell in _new_cells(fire_set, self.seen_fire):
+            u = self.graph.cell_id(cell)
+            risk[u] = INF
+            for v in targets[offsets[u]:offsets[u + 1]]:
+                risk[v] += self.risk_weight
+        path = astar_path(self.grid, bot_pos, self.button, fire_set, risk=risk)
         if path is None or len(path) < 2:
             return bot_pos
         return path[1]
 
+# Bot 5: Monte-Carlo risk-aware bot. For each candidate move (stay or step to a
+# non-burning neighbor) it takes the shortest fire-avoiding path from there to the
+# button, plus detours found by A* with cells penalized by how often the sampled
+# fires reach them before the bot could (route_weights scale that penalty). Every
+# route's survival is estimated over many future fires sampled from the current one,
+# and the bot moves to the candidate with the best route, preferring shorter routes
+# on ties. When the fire cannot reach the shortest path in time even spreading every
+# tick, it skips the rollouts.
+# All rollouts of a step share one batch of sampled fires: each rollout records the
+# tick at which every cell ignites, so checking a path is a lookup per cell. With
+# numpy the rollouts are vectorized with BatchFireSpread; without it they run with
+# FireSpread one at a time. Rollouts are added in chunks until 'rollouts' is reached
+# or the per-move time budget (seconds) runs out.
+class Bot5:
+    def __init__(self, grid, button, q, rollouts=64, time_budget=0.05, horizon=200, seed=0,
+                 route_weights=(4, 16, 64)):
+        self.grid = grid
+        self.button = button
+        self.q = q
+        self.rollouts = rollouts
+        self.time_budget = time_budget
+        self.horizon = horizon
+        self.route_weights = route_weights
+        self.rng = random.Random(seed)
+        self.np_rng = np.random.default_rng(seed) if np is not None else None
+        self.ship = ship_array(grid) if np is not None else None  # converted once
+        self.graph = ship_graph(grid)
+
+    def _path_from(self, field, cell):
+        """Cell ids of the field-following path from cell to the button, or None."""
+        if field.distance(cell) == INF:
+            return None
+        path = [cell]
+        while path[-1] != self.button and len(path) <= self.horizon:
+            path.append(field.next_move(path[-1]))
+        return [self.graph.cell_id(c) for c in path]
+
+    def _sample_fires(self, fire_set, ticks):
+        """
+        Samples future fires from fire_set for 'ticks' ticks and returns the tick at
+        which each cell ignites in each rollout: an (N, D*D) int array (cells that did
+        not ignite hold NEVER) with numpy, otherwise a list of {cell id: tick} dicts.
+        """
+        deadline = None if self.time_budget is None else time.perf_counter() + self.time_budget
+        chunks, done = [], 0
+        while done < self.rollouts:
+            n = min(16, self.rollouts - done)
+            if self.np_rng is not None:
+                fire = BatchFireSpread(self.ship, [fire_set] * n, self.q, self.np_rng)
+                arrival = np.full(fire.mask.size, NEVER, dtype=np.int32)
+                for t in range(1, ticks + 1):
+                    fire.spread()
+                    arrival[fire.ignited] = t
+                chunks.append(arrival.reshape(n, -1))
+            else:
+                for _ in range(n):
+                    fire = FireSpread(self.grid, fire_set, self.q, self.rng)
+                    arrival = {}
+                    for t in range(1, ticks + 1):
+                        for cell in fire.spread():
+                            arrival[self.graph.cell_id(cell)] = t
+                    chunks.append(arrival)
+            done += n
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+        return np.concatenate(chunks) if self.np_rng is not None else chunks
+
+    def _limits(self, path):
+        # The bot enters path[t] on step t + 1 and must not be burning after that
+        # step's spread, the button included.
+        return list(range(1, len(path) + 1))
+
+    def _out_of_reach(self, fire_set, path):
+        """
+        True if no fire can possibly reach path in time. Fire moves at most one cell
+        per tick, so a cell at BFS distance d from the fire cannot ignite before tick d.
+        """
+        limits = self._limits(path)
+        depth_limit = max(limits)
+        offsets, targets = self.graph.offsets, self.graph.targets
+        depth = {u: 0 for u in self.graph.ids(fire_set)}
+        queue = deque(depth)
+        while queue:
+            u = queue.popleft()
+            d = depth[u] + 1
+            if d > depth_limit:
+                break
+            for v in targets[offsets[u]:offsets[u + 1]]:
+                if v not in depth:
+                    depth[v] = d
+                    queue.append(v)
+        return all(depth.get(u, INF) > limit for u, limit in zip(path, limits))
+
+    def _survival(self, samples, path):
+        """Fraction of sampled fires in which the bot survives along path."""
+        limits = self._limits(path)
+        if self.np_rng is not None:
+            return float((samples[:, path] > np.array(limits)).all(axis=1).mean())
+        survived = 0
+        for arrival in samples:
+            survived += all(arrival.get(u, NEVER) > limit for u, limit in zip(path, limits))
+        return survived / len(samples)
+
+    def _danger(self, samples, bot_pos, fire_set):
+        """
+        Per-cell step penalty from the sampled fires, for astar_path: the fraction of
+        rollouts in which a cell is burning by the time the bot could first get there
+        (its distance from bot_pos, ignoring the fire), INF for burning cells.
+        """
+        reach = _bfs_distances(self.graph, [bot_pos], ())
+        if self.np_rng is not None:
+            arrive = np.minimum(np.array(reach, dtype=float), NEVER - 1).astype(np.int32)
+            p = (samples <= arrive + 1).mean(axis=0)
+            danger = p.tolist()
+        else:
+            danger = [0] * len(reach)
+            for arrival in samples:
+                for u, t in arrival.items():
+                    if t <= reach[u] + 1:
+                        danger[u] += 1 / len(samples)
+        for u in self.graph.ids(fire_set):
+            danger[u] = INF
+        return danger
+
+    def _routes(self, cell, fire_set, dangers):
+        """Cell ids of the distinct fire-avoiding routes from cell, one per danger map."""
+        routes = []
+        for risk in dangers:
+            path = astar_path(self.grid, cell, self.button, fire_set, risk=risk)
+            if path is not None and len(path) <= self.horizon + 1:
+                route = [self.graph.cell_id(c) for c in path]
+                if route not in routes:
+                    routes.append(route)
+        return routes
+
+    def next_move(self, bot_pos, fire_set):
+        field = DISTANCE_FIELDS.get(self.grid, self.button, fire_set)
+        candidates = [bot_pos] + [n for n in get_neighbors(bot_pos, self.grid) if n not in fire_set]
+        paths = {}
+        for cell in candidates:
+            if cell == self.button:
+                return cell
+            path = self._path_from(field, cell)
+            if path is not None:
+                paths[cell] = path
+        if not paths:
+            return bot_pos
+        if len(paths) == 1:
+            return next(iter(paths))
+        # No rollouts needed when the shortest path is certainly safe.
+        shortest = min(paths, key=lambda cell: len(paths[cell]))
+        if self._out_of_reach(fire_set, paths[shortest]):
+            return shortest
+
+        # Besides its shortest path, each candidate gets routes that trade length
+        # for distance from where the sampled fires burn, and is scored by the
+        # best of them.
+        ticks = min(2 * max(len(p) for p in paths.values()), self.horizon)
+        samples = self._sample_fires(fire_set, ticks)
+        danger = self._danger(samples, bot_pos, fire_set)
+        dangers = [[w * p for p in danger] for w in self.route_weights]
+        best, best_score = bot_pos, None
+        for cell, path in paths.items():
+            for route in [path] + self._routes(cell, fire_set, dangers):
+                score = (self._survival(samples, route), -len(route))
+                if best_score is None or score > best_score:
+                    best, best_score = cell, score
+        return best
+
+#############################
+# Headless Simulation
+#############################
+
+# Outcome of one run. bot_path lists every position the bot occupied, starting at 'start'.
+# 'recording' is the run's Recording when it was recorded, else None.
+SimulationResult = namedtuple(
+    "SimulationResult",
+    ["success", "steps", "fire_size", "bot_path", "start", "button", "initial_fire",
+     "recording"],
+    defaults=(None,),
+)
+
+def place_entities(grid, rng=None):
+    """Picks three distinct open cells: (bot start, button, initial fire)."""
+    rng = rng or random
+    D = len(grid)
+    open_cells = [(i, j) for i in range(D) for j in range(D) if grid[i][j] == 1]
+    if len(open_cells) < 3:
+        raise ValueError("Not enough open cells to start simulation.")
+    return tuple(rng.sample(open_cells, 3))
+
+def make_bot(bot_class, grid, start, button, initial_fire, q=None, fire_set=None):
+    """
+    Instantiates a bot (Bot1 requires the start and initial fire, Bot5 the flammability q,
+    others just need grid and button). fire_set optionally gives all cells burning at
+    the start, for fires with several origins.
+    """
+    if bot_class == Bot1:
+        return Bot1(grid, start, button, initial_fire, fire_set)
+    if bot_class == Bot5:
+        return Bot5(grid, button, q)
+    return bot_class(grid, button)
+
+class Simulation:
+    """
+    A single bot-vs-fire run, advanced one time step at a time with step().
+    Each step the bot moves and then the fire spreads. The run succeeds when the bot
+    is on the button after the spread and fails when the bot ends up on a burning
+    cell, so reaching the button in the step that it catches fire is a failure, as in
+    the original UI. It also ends as a failure once nothing can change anymore: the
+    bot stays put and the fire has no way left to spread.
+    With vectorized=True the fire uses the NumPy-backed ArrayFireSpread.
+    With record=True the cells ignited by every step are kept in 'fire_log', so
+    recording() can turn the run into a replayable Recording.
+    With a Stats object as 'stats', every step is instrumented: the planner and fire
+    counters go into it and the "plan" (bot.next_move), "spread" and "move" (the rest
+    of the step) phases are timed.
+    """
+    def __init__(self, grid, bot_class, q, seed=None, placement=None, vectorized=False,
+                 record=False, stats=None):
+        self.grid = grid
+        self.q = q
+        self.seed = seed
+        self.bot_class = bot_class
+        self.rng = random.Random(seed) if seed is not None else random
+        if placement is None:
+            placement = place_entities(grid, self.rng)
+        self.start, self.button, self.initial_fire = placement
+        self.bot = make_bot(bot_class, grid, self.start, self.button, self.initial_fire, q)
+        self.bot_pos = self.start
+        self.bot_path = [self.start]
+        if vectorized:
+            _require_numpy()
+            np_rng = np.random.default_rng(self.rng.getrandbits(64))
+            self.fire = ArrayFireSpread(grid, [self.initial_fire], q, np_rng)
+        else:
+            self.fire = FireSpread(grid, [self.initial_fire], q, self.rng)
+        self.new_fire = [self.initial_fire]  # cells ignited by the latest step
+        self.steps = 0
+        self.done = False
+        self.success = False
+        self.fire_log = [] if record else None
+        self.stats = stats
+
+    def step(self):
+        """Advances the simulation by one time step. Returns True once the run is over."""
+        if self.done:
+            return True
+        if self.stats is None:
+            done = self._advance()
+        else:
+            done = self._instrumented_advance()
+        if self.fire_log is not None:
+            self.fire_log.append(self.new_fire)
+        return done
+
+    def _instrumented_advance(self):
+        """_advance with self.stats active; the time not spent in plan or spread is "move"."""
+        stats = self.stats
+        phases = stats.phases
+        before = sum(phases[p][0] for p in ("plan", "spread") if p in phases)
+        previous = set_stats(stats)
+        start = time.perf_counter()
+        try:
+            done = self._advance()
+        finally:
+            set_stats(previous)
+        elapsed = time.perf_counter() - start
+        timed = sum(phases[p][0] for p in ("plan", "spread") if p in phases) - before
+        stats.add_time("move", elapsed - timed)
+        return done
+
+    def _advance(self):
+        stats = self.stats
+        self.new_fire = []
+        prev_pos = self.bot_pos
+        if stats is not None:
+            t = time.perf_counter()
+        self.bot_pos = self.bot.next_move(self.bot_pos, self.fire_set)
+        if stats is not None:
+            stats.add_time("plan", time.perf_counter() - t)
+        self.bot_path.append(self.bot_pos)
+        self.steps += 1
+
+        # Walking into a burning cell ends the run, even on the button.
+        if self.bot_pos in self.fire_set:
+            self.done = True
+            return True
+
+        if stats is not None:
+            t = time.perf_counter()
+        self.new_fire = self.fire.spread()
+        if stats is not None:
+            stats.add_time("spread", time.perf_counter() - t)
+        if self.bot_pos in self.fire_set:
+            self.done = True
+        elif self.bot_pos == self.button:
+            # The button counts only if it is not on fire after this step's spread.
+            self.done = self.success = True
+        elif self.bot_pos == prev_pos and not self.new_fire and not self.fire.can_spread():
+            self.done = True
+        return self.done
+
+    @property
+    def fire_set(self):
+        """The set of burning cells."""
+        return self.fire.burning
+
+    def recording(self):
+        """The run so far as a Recording (requires record=True)."""
+        if self.fire_log is None:
+            raise ValueError("Simulation was not created with record=True.")
+        return Recording(
+            grid=self.grid,
+            q=self.q,
+            seed=self.seed,
+            bot_name=self.bot_class.__name__,
+            start=self.start,
+            button=self.button,
+            initial_fire=self.initial_fire,
+            success=self.success,
+            bot_path=list(self.bot_path),
+            ignitions=[list(cells) for cells in self.fire_log],
+        )
+
+    def result(self):
+        return SimulationResult(
+            success=self.success,
+            steps=self.steps,
+            fire_size=len(self.fire_set),
+            bot_path=self.bot_path,
+            start=self.start,
+            button=self.button,
+            initial_fire=self.initial_fire,
+            recording=self.recording() if self.fire_log is not None else None,
+        )
+
+def run_simulation(grid, bot_class, q, seed=None, max_steps=None, placement=None,
+                   vectorized=False, record=False, stats=None):
+    """
+    Runs one simulation without any UI and returns a SimulationResult.
+    With a seed, the placement and the fire spread are reproducible.
+    max_steps optionally caps the run length; a capped run counts as a failure.
+    With record=True the result carries a Recording of the run.
+    With a Stats object as 'stats', the run's counters and phase times are added to it.
+    A fresh button costs one BFS over the ship, then each tick at most one local
+    repair of the field; on a D=50 ship at q=0.3 that is roughly 1000 runs/s for
+    Bot1 and 150-250 runs/s for Bot2-Bot4.
+    """
+    sim = Simulation(grid, bot_class, q, seed=seed, placement=placement,
+                     vectorized=vectorized, record=record, stats=stats)
+    while not sim.step():
+        if max_steps is not None and sim.steps >= max_steps:
+            break
+    return sim.result()
+
+#############################
+# Recording and Replay
+#############################
+
+# A recorded run: everything needed to show it again without re-running the bot's
+# planner or the fire. bot_path has steps + 1 positions (starting at 'start') and
+# ignitions[t] lists the cells that caught fire during step t + 1.
+Recording = namedtuple(
+    "Recording",
+    ["grid", "q", "seed", "bot_name", "start", "button", "initial_fire", "success",
+     "bot_path", "ignitions"],
+)
+
+# File layout: magic, format version, then one zlib-compressed body holding
+#   D, q, seed, bot name, start/button/initial fire (flat ids), success, steps,
+#   the ship as a packed bitmap (row-major, 1 bit per cell),
+#   and for every step: the bot's move code, the number of cells ignited and the
+#   gaps between their sorted flat ids.
+# Integers are unsigned LEB128 varints, so a typical step costs a handful of bytes.
+RECORDING_MAGIC = b"FIRELOG"
+RECORDING_VERSION = 1
+# Move codes for the bot's step; anything else is stored as MOVE_JUMP plus the cell id.
+MOVE_CODES = {(0, 0): 0, (1, 0): 1, (-1, 0): 2, (0, 1): 3, (0, -1): 4}
+MOVE_JUMP = 5
+_MOVE_DELTAS = {code: delta for delta, code in MOVE_CODES.items()}
+
+def _write_varint(buf, n):
+    while n >= 0x80:
+        buf.append((n & 0x7F) | 0x80)
+        n >>= 7
+    buf.append(n)
+
+def _read_varint(data, pos):
+    n = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        n |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return n, pos
+        shift += 7
+
+def _pack_bits(grid):
+    """The ship as a row-major bitmap, 1 bit per cell (1 = open)."""
+    D = len(grid)
+    bits = bytearray((D * D + 7) // 8)
+    k = 0
+    for row in grid:
+        for value in row:
+            if value == 1:
+                bits[k >> 3] |= 0x80 >> (k & 7)
+            k += 1
+    return bits
+
+def _unpack_bits(bits, D):
+    return [[(bits[k >> 3] >> (7 - (k & 7))) & 1 for k in range(i * D, (i + 1) * D)]
+            for i in range(D)]
+
+def encode_recording(recording):
+    """Serializes a Recording to the compact binary log format (bytes)."""
+    D = len(recording.grid)
+    body = bytearray(struct.pack("<Id", D, recording.q))
+    # Seeds are stored zigzag-encoded plus one (any int works); 0 means no seed.
+    seed = recording.seed
+    if seed is None:
+        _write_varint(body, 0)
+    else:
+        _write_varint(body, 1 + (seed << 1 if seed >= 0 else (~seed << 1) | 1))
+    name = recording.bot_name.encode("utf-8")
+    _write_varint(body, len(name))
+    body += name
+    for i, j in (recording.start, recording.button, recording.initial_fire):
+        _write_varint(body, i * D + j)
+    body.append(1 if recording.success else 0)
+    _write_varint(body, len(recording.ignitions))
+    body += _pack_bits(recording.grid)
+
+    prev = recording.bot_path[0]
+    for pos, cells in zip(recording.bot_path[1:], recording.ignitions):
+        code = MOVE_CODES.get((pos[0] - prev[0], pos[1] - prev[1]))
+        if code is None:
+            body.append(MOVE_JUMP)
+            _write_varint(body, pos[0] * D + pos[1])
+        else:
+            body.append(code)
+        prev = pos
+        _write_varint(body, len(cells))
+        last = 0
+        for cell in sorted(i * D + j for i, j in cells):
+            _write_varint(body, cell - last)
+            last = cell
+    return RECORDING_MAGIC + bytes([RECORDING_VERSION]) + zlib.compress(bytes(body))
+
+def decode_recording(data):
+    """Parses bytes written by encode_recording back into a Recording."""
+    header = len(RECORDING_MAGIC)
+    if data[:header] != RECORDING_MAGIC:
+        raise ValueError("Not a fire simulation recording.")
+    if data[header] != RECORDING_VERSION:
+        raise ValueError(f"Unsupported recording version {data[header]}.")
+    body = zlib.decompress(data[header + 1:])
+
+    D, q = struct.unpack_from("<Id", body)
+    pos = struct.calcsize("<Id")
+    seed, pos = _read_varint(body, pos)
+    if seed == 0:
+        seed = None
+    else:
+        seed -= 1
+        seed = ~(seed >> 1) if seed & 1 else seed >> 1
+    n, pos = _read_varint(body, pos)
+    bot_name = body[pos:pos + n].decode("utf-8")
+    pos += n
+    cells = []
+    for _ in range(3):
+        cell, pos = _read_varint(body, pos)
+        cells.append(divmod(cell, D))
+    start, button, initial_fire = cells
+    success = bool(body[pos])
+    steps, pos = _read_varint(body, pos + 1)
+    n = (D * D + 7) // 8
+    grid = _unpack_bits(body[pos:pos + n], D)
+    pos += n
+
+    bot_path = [start]
+    ignitions = []
+    for _ in range(steps):
+        code = body[pos]
+        pos += 1
+        if code == MOVE_JUMP:
+            cell, pos = _read_varint(body, pos)
+            bot_path.append(divmod(cell, D))
+        else:
+            di, dj = _MOVE_DELTAS[code]
+            i, j = bot_path[-1]
+            bot_path.append((i + di, j + dj))
+        n, pos = _read_varint(body, pos)
+        cell = 0
+        ignited = []
+        for _ in range(n):
+            gap, pos = _read_varint(body, pos)
+            cell += gap
+            ignited.append(divmod(cell, D))
+        ignitions.append(ignited)
+    return Recording(grid, q, seed, bot_name, start, button, initial_fire, success,
+                     bot_path, ignitions)
+
+def save_recording(recording, filename):
+    """Writes a Recording to 'filename' (creating its directory if needed)."""
+    directory = os.path.dirname(filename)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(filename, "wb") as f:
+        f.write(encode_recording(recording))
+
+def load_recording(filename):
+    """Reads a Recording saved with save_recording."""
+    with open(filename, "rb") as f:
+        return decode_recording(f.read())
+
+class Replay:
+    """
+    Plays a Recording back one step at a time. It has the same interface as
+    Simulation (step(), bot_pos, fire_set, new_fire, steps, done, success, result()),
+    so anything that drives a Simulation can drive a replay; nothing is recomputed,
+    each step just applies the next recorded move and ignitions.
+    """
+    def __init__(self, recording):
+        self.recording = recording
+        self.grid = recording.grid
+        self.q = recording.q
+        self.start = recording.start
+        self.button = recording.button
+        self.initial_fire = recording.initial_fire
+        self.bot_pos = self.start
+        self.bot_path = [self.start]
+        self.fire_set = {self.initial_fire}
+        self.new_fire = [self.initial_fire]
+        self.steps = 0
+        self.done = not recording.ignitions
+        self.success = self.done and recording.success
+        self.stats = None
+
+    def step(self):
+        """Applies the next recorded step. Returns True once the replay is over."""
+        if self.done:
+            return True
+        self.bot_pos = self.recording.bot_path[self.steps + 1]
+        self.bot_path.append(self.bot_pos)
+        self.new_fire = self.recording.ignitions[self.steps]
+        self.fire_set.update(self.new_fire)
+        self.steps += 1
+        if self.steps == len(self.recording.ignitions):
+            self.done = True
+            self.success = self.recording.success
+        return self.done
+
+    def seek(self, steps):
+        """Fast-forwards to just after step 'steps' (no rendering in between)."""
+        while self.steps < steps and not self.step():
+            pass
+
+    def result(self):
+        return SimulationResult(
+            success=self.success,
+            steps=self.steps,
+            fire_size=len(self.fire_set),
+            bot_path=self.bot_path,
+            start=self.start,
+            button=self.button,
+            initial_fire=self.initial_fire,
+            recording=self.recording,
+        )
+
+def replay(recording):
+    """Replays a Recording headless and returns the final SimulationResult."""
+    player = Replay(recording)
+    while not player.step():
+        pass
+    return player.result()
+
+#############################
+# Multi-bot Scenarios
+#############################
+
+# Outcome of a multi-bot run: how many bots reached a button, burned or were left stuck
+# (cut off when the fire stopped, or still running at max_steps), the number of steps,
+# and for every bot the step its run ended at (None for stuck bots).
+ScenarioResult = namedtuple(
+    "ScenarioResult", ["saved", "burned", "stuck", "steps", "fire_size", "finish_steps"],
+)
+
+def place_scenario(grid, n_bots, n_buttons=1, n_fires=1, rng=None):
+    """Picks distinct open cells: (bot starts, buttons, fire origins), each a list."""
+    rng = rng or random
+    D = len(grid)
+    open_cells = [(i, j) for i in range(D) for j in range(D) if grid[i][j] == 1]
+    needed = n_bots + n_buttons + n_fires
+    if len(open_cells) < needed:
+        raise ValueError(f"Not enough open cells to place {needed} entities.")
+    cells = rng.sample(open_cells, needed)
+    return cells[:n_bots], cells[n_bots:n_bots + n_buttons], cells[n_bots + n_buttons:]
+
+class Scenario:
+    """
+    Many bots, several buttons and several fire origins on one ship, advanced one
+    time step at a time with step(). Every bot tries to reach any button and bots do
+    not block each other. Each step all active bots move, then the fire spreads, with
+    Simulation's rules applied to every bot. The run ends when no bot is active, or
+    when no bot moved and the fire cannot spread anymore (the rest are stuck).
+
+    With bot_class=Bot2 (the default) every bot heads for the nearest button through
+    one multi-source DistanceField over all buttons. The first bot to move in a step
+    blocks the step's new fire in it and the others only look up their next cell, so
+    a step costs O(new fire + bots) however many bots there are. Any other strategy
+    gets its own instance per bot, aimed at the button nearest to its start.
+    """
+    def __init__(self, grid, q, n_bots=1, n_buttons=1, n_fires=1, bot_class=Bot2,
+                 seed=None, placement=None):
+        self.grid = grid
+        self.q = q
+        self.rng = random.Random(seed) if seed is not None else random
+        if placement is None:
+            placement = place_scenario(grid, n_bots, n_buttons, n_fires, self.rng)
+        self.starts, self.buttons, self.origins = (list(cells) for cells in placement)
+        self.button_set = frozenset(self.buttons)
+        self.fire = FireSpread(grid, self.origins, q, self.rng)
+
+        if bot_class is Bot2:
+            fields = DistanceFieldCache(max_entries=1)
+            self.bots = [Bot2(grid, self.button_set, fields) for _ in self.starts]
+        else:
+            # One field per button, used once to give every bot its nearest button.
+            button_fields = [DistanceField(grid, button, blocked=self.origins)
+                             for button in self.buttons]
+            self.bots = []
+            for start in self.starts:
+                nearest = min(range(len(self.buttons)),
+                              key=lambda b: button_fields[b].distance(start))
+                self.bots.append(make_bot(bot_class, grid, start, self.buttons[nearest],
+                                          self.origins[0], q, fire_set=self.fire.burning))
+
+        self.positions = list(self.starts)
+        self.finish_steps = [None] * len(self.starts)
+        self.active = []
+        self.saved = self.burned = 0
+        for k, pos in enumerate(self.positions):
+            if pos in self.button_set:  # cannot happen with place_scenario
+                self.saved += 1
+                self.finish_steps[k] = 0
+            else:
+                self.active.append(k)
+        self.new_fire = list(self.origins)
+        self.steps = 0
+        self.done = not self.active
+
+    @property
+    def fire_set(self):
+        """The set of burning cells."""
+        return self.fire.burning
+
+    def step(self):
+        """Advances every active bot and then the fire. Returns True once the run is over."""
+        if self.done:
+            return True
+        self.steps += 1
+        fire_set, positions, buttons = self.fire.burning, self.positions, self.button_set
+        moved = False
+        still = []
+        for k in self.active:
+            pos = self.bots[k].next_move(positions[k], fire_set)
+            if pos != positions[k]:
+                moved = True
+                positions[k] = pos
+            # Walking into a burning cell ends the bot's run, even on a button.
+            if pos in fire_set:
+                self.burned += 1
+                self.finish_steps[k] = self.steps
+            else:
+                still.append(k)
+
+        self.new_fire = self.fire.spread()
+        self.active = []
+        for k in still:
+            if positions[k] in fire_set:
+                self.burned += 1
+                self.finish_steps[k] = self.steps
+            elif positions[k] in buttons:
+                self.saved += 1
+                self.finish_steps[k] = self.steps
+            else:
+                self.active.append(k)
+        if not self.active:
+            self.done = True
+        elif not moved and not self.new_fire and not self.fire.can_spread():
+            self.done = True
+        return self.done
+
+    def result(self):
+        return ScenarioResult(
+            saved=self.saved,
+            burned=self.burned,
+            stuck=len(self.active),
+            steps=self.steps,
+            fire_size=len(self.fire_set),
+            finish_steps=self.finish_steps,
+        )
+
+def run_scenario(grid, q, n_bots=1, n_buttons=1, n_fires=1, bot_class=Bot2, seed=None,
+                 max_steps=None, placement=None):
+    """
+    Runs one multi-bot Scenario without any UI and returns a ScenarioResult.
+    With a seed, the placement and the fire spread are reproducible.
+    max_steps optionally caps the run length; bots still running then count as stuck.
+    """
+    scenario = Scenario(grid, q, n_bots, n_buttons, n_fires, bot_class, seed=seed,
+                        placement=placement)
+    while not scenario.step():
+        if max_steps is not None and scenario.steps >= max_steps:
+            break
+    return scenario.result()
+
+#############################
+# Batched Simulation (NumPy)
+#############################
+
+def _grow(frontier):
+    """Cells 4-adjacent to any cell of 'frontier' (per trial for (N, D, D) masks)."""
+    grown = np.zeros_like(frontier)
+    grown[..., 1:, :] |= frontier[..., :-1, :]
+    grown[..., :-1, :] |= frontier[..., 1:, :]
+    grown[..., :, 1:] |= frontier[..., :, :-1]
+    grown[..., :, :-1] |= frontier[..., :, 1:]
+    return grown
+
+class BatchFireSpread:
+    """
+    N independent fires on the same ship, advanced in lockstep. 'origins' gives,
+    for each trial, the cells burning at the start. 'mask' is an (N, D, D) boolean
+    array; one spread() call computes the neighbor counts and the random draw for
+    every trial at once. Trials that are no longer active are frozen. mask[k] (or
+    FireMask(mask[k])) is trial k's fire.
+    """
+    def __init__(self, grid, origins, q, rng=None):
+        _require_numpy()
+        self.ship = grid if isinstance(grid, np.ndarray) else ship_array(grid)
+        self.q = q
+        self.rng = rng if rng is not None else np.random.default_rng()
+        D0, D1 = self.ship.shape
+        self.mask = np.zeros((len(origins), D0, D1), dtype=bool)
+        for k, cells in enumerate(origins):
+            cells = list(cells)
+            if cells:
+                rows, cols = zip(*cells)
+                self.mask[k, list(rows), list(cols)] = True
+        self.frontier_size = np.ones(len(origins), dtype=np.int64)
+        self.ignited = np.empty(0, dtype=np.intp)
+
+    def spread(self, active=None):
+        """
+        Advances every active trial by one tick. Returns the number of cells each
+        trial ignited. Afterwards 'ignited' holds the flat mask indices of the cells
+        that caught fire and frontier_size how many cells could have caught fire
+        this tick (0 means that fire can never grow again).
+        """
+        K = burning_neighbor_counts(self.mask)
+        cand = (self.ship == 1) & ~self.mask & (K > 0)
+        if active is not None:
+            cand &= active[:, None, None]
+        if self.q <= 0:
+            cand[:] = False  # nothing can ignite, so every fire has stopped
+        self.frontier_size = cand.sum(axis=(1, 2))
+        candidates = np.flatnonzero(cand)
+        prob = np.asarray(fire_probabilities(self.q))[K.ravel()[candidates]]
+        ignited = candidates[self.rng.random(candidates.size) < prob]
+        self.mask.ravel()[ignited] = True
+        self.ignited = ignited
+        cells = self.ship.size
+        return np.bincount(ignited // cells, minlength=self.mask.shape[0])
+
+def batch_next_moves(passable, goals, positions):
+    """
+    Batched replanning for N trials at once. 'passable' is an (N, D, D) mask of
+    cells each trial may step on, and goals/positions give each trial's target and
+    bot position. A BFS wavefront expands from every goal at the same time, one
+    array operation per distance level, and stops as soon as every trial has found
+    its next step.
+    Returns, per trial, the neighbor to move to, the position itself if it is
+    already at the goal, or None when no path exists. The chosen neighbor is the
+    first one (in get_neighbors order) at minimum distance to the goal, the same
+    step as DistanceField.next_move (bfs_path may break such ties differently).
+    """
+    N, D0, D1 = passable.shape
+    moves = [None] * N
+    # (trial, i, j) of every in-bounds neighbor of each bot, in get_neighbors order.
+    nb_k, nb_i, nb_j = [], [], []
+    for k, (pos, goal) in enumerate(zip(positions, goals)):
+        if pos == goal:
+            moves[k] = pos
+            continue
+        i, j = pos
+        for di, dj in [(1, 0), (-1, 0), (0, 1), (0, -1)]:
+            ni, nj = i + di, j + dj
+            if 0 <= ni < D0 and 0 <= nj < D1:
+                nb_k.append(k)
+                nb_i.append(ni)
+                nb_j.append(nj)
+    nb_k, nb_i, nb_j = np.array(nb_k, dtype=np.intp), np.array(nb_i, dtype=np.intp), np.array(nb_j, dtype=np.intp)
+
+    unreached = np.iinfo(np.int32).max
+    dist = np.full(passable.shape, unreached, dtype=np.int32)
+    frontier = np.zeros_like(passable)
+    for k, (gi, gj) in enumerate(goals):
+        frontier[k, gi, gj] = passable[k, gi, gj]
+    dist[frontier] = 0
+    reached = frontier.copy()
+    d = 0
+    while nb_k.size:
+        found = np.bincount(nb_k[reached[nb_k, nb_i, nb_j]], minlength=N) > 0
+        waiting = ~found & frontier.any(axis=(1, 2))
+        if not waiting.any():
+            break
+        d += 1
+        frontier = _grow(frontier) & passable & ~reached
+        dist[frontier] = d
+        reached |= frontier
+
+    nb_dist = dist[nb_k, nb_i, nb_j]
+    best = {}
+    for k, ni, nj, nd in zip(nb_k.tolist(), nb_i.tolist(), nb_j.tolist(), nb_dist.tolist()):
+        if nd != unreached and (k not in best or nd < best[k][0]):
+            best[k] = (nd, (ni, nj))
+    for k, (_, cell) in best.items():
+        moves[k] = cell
+    return moves
+
+def _batch_bot_moves(bot_class, ship, masks, goals, positions):
+    """Next moves of Bot2 / Bot3 for a batch of trials (masks is (N, D, D))."""
+    open_cells = (ship == 1)[None, :, :]
+    avoid_fire = open_cells & ~masks
+    if bot_class == Bot2:
+        moves = batch_next_moves(avoid_fire, goals, positions)
+    else:
+        # Bot3: avoid fire and cells next to fire, falling back to avoiding fire only.
+        adjacent = burning_neighbor_counts(masks) > 0
+        moves = batch_next_moves(avoid_fire & ~adjacent, goals, positions)
+        retry = [k for k, move in enumerate(moves) if move is None]
+        if retry:
+            fallback = batch_next_moves(avoid_fire[retry], [goals[k] for k in retry],
+                                        [positions[k] for k in retry])
+            for k, move in zip(retry, fallback):
+                moves[k] = move
+    return [pos if move is None else move for pos, move in zip(positions, moves)]
+
+# Bots whose planning can be batched across trials.
+BATCHABLE_BOTS = (Bot2, Bot3)
+
+def run_batch(grid, bot_class, q, n_trials, seed=None, placements=None, max_steps=None):
+    """
+    Runs n_trials independent simulations on the same ship in lockstep and returns
+    a list of SimulationResult. Fire spread for all trials is one array operation
+    per tick; Bot2 and Bot3 plan for all trials at once with batch_next_moves, and
+    the other bots are stepped one trial at a time.
+    Per-step rules match Simulation.
+    """
+    _require_numpy()
+    rng = random.Random(seed) if seed is not None else random
+    if placements is None:
+        placements = [place_entities(grid, rng) for _ in range(n_trials)]
+    ship = ship_array(grid)
+    fire = BatchFireSpread(ship, [[p[2]] for p in placements], q,
+                           np.random.default_rng(rng.getrandbits(64)))
+    starts = [p[0] for p in placements]
+    buttons = [p[1] for p in placements]
+    batched = bot_class in BATCHABLE_BOTS
+    bots = None if batched else [make_bot(bot_class, grid, *p, q=q) for p in placements]
+
+    positions = list(starts)
+    paths = [[pos] for pos in starts]
+    steps = [0] * n_trials
+    success = [False] * n_trials
+    active = np.ones(n_trials, dtype=bool)
+    tick = 0
+    while active.any() and (max_steps is None or tick < max_steps):
+        tick += 1
+        live = np.flatnonzero(active).tolist()
+        prev = list(positions)
+        if batched:
+            moves = _batch_bot_moves(bot_class, ship, fire.mask[live],
+                                     [buttons[k] for k in live], [positions[k] for k in live])
+        else:
+            # Per-trial bots probe the fire cell by cell, which is cheaper on a set.
+            moves = [bots[k].next_move(positions[k], set(FireMask(fire.mask[k]))) for k in live]
+
+        for k, move in zip(live, moves):
+            positions[k] = move
+            paths[k].append(move)
+            steps[k] = tick
+            if fire.mask[k, move[0], move[1]]:
+                active[k] = False
+
+        ignited = fire.spread(active)
+        for k in live:
+            if not active[k]:
+                continue
+            i, j = positions[k]
+            if fire.mask[k, i, j]:
+                active[k] = False
+            elif positions[k] == buttons[k]:
+                active[k] = False
+                success[k] = True
+            elif (positions[k] == prev[k] and ignited[k] == 0
+                  and (q <= 0 or fire.frontier_size[k] == 0)):
+                active[k] = False
+
+    fire_sizes = fire.mask.sum(axis=(1, 2)).tolist()
+    return [
+        SimulationResult(success=success[k], steps=steps[k], fire_size=fire_sizes[k],
+                         bot_path=paths[k], start=starts[k], button=buttons[k],
+                         initial_fire=placements[k][2])
+        for k in range(n_trials)
+    ]
+
+#############################
+# Fire Arrival-time Maps
+#############################
+
+def ship_hash(grid):
+    """Stable hex digest of a ship's layout, used to key cached per-ship data."""
+    D = len(grid)
+    cells = bytes(int(cell) for row in grid for cell in row)
+    return hashlib.sha1(str(D).encode() + b":" + cells).hexdigest()
+
+class FireArrivalMap:
+    """
+    For one ship, fire origin and q: an estimate of when each cell catches fire,
+    built from many vectorized fire simulations. burning[t, u] is the number of
+    samples in which cell id u is burning after t ticks, so the probability that
+    a cell is burning at time t is a single lookup. After 'horizon' ticks the last
+    row is used, which is exact when every sampled fire had stopped by then
+    (complete = True) and a lower bound otherwise.
+    """
+    def __init__(self, burning, n_samples, D, complete):
+        self.burning = burning
+        self.n_samples = n_samples
+        self.D = D
+        self.horizon = burning.shape[0] - 1
+        self.complete = complete
+
+    @classmethod
+    def compute(cls, grid, origin, q, n_samples=1000, horizon=None, seed=None, batch=200):
+        """
+        Runs n_samples fires from origin in batches of 'batch' with BatchFireSpread.
+        Without a horizon each batch runs until none of its fires can grow.
+        """
+        _require_numpy()
+        ship = ship_array(grid)
+        rng = np.random.default_rng(seed)
+        rows = []  # rows[t] = burning count per cell after t ticks, summed over batches
+        complete = True
+        done = 0
+        while done < n_samples:
+            n = min(batch, n_samples - done)
+            fire = BatchFireSpread(ship, [[origin]] * n, q, rng)
+            t = 0
+            last = fire.mask.sum(axis=0, dtype=np.int64).ravel()
+            history = [last]
+            while horizon is None or t < horizon:
+                fire.spread()
+                t += 1
+                last = fire.mask.sum(axis=0, dtype=np.int64).ravel()
+                history.append(last)
+                if not fire.frontier_size.any():
+                    break
+            else:
+                complete = complete and not fire.frontier_size.any()
+            # A fire that has stopped stays as it is, so shorter runs are padded with
+            # their final counts.
+            while len(rows) < len(history):
+                rows.append(rows[-1].copy() if rows else np.zeros_like(last))
+            for k in range(len(rows)):
+                rows[k] += history[min(k, len(history) - 1)]
+            done += n
+        dtype = np.uint16 if n_samples < 2 ** 16 else np.uint32
+        return cls(np.stack(rows).astype(dtype), n_samples, len(grid), complete)
+
+    def prob_burning(self, cell, t):
+        """Estimated probability that cell is burning after t ticks."""
+        t = min(max(t, 0), self.horizon)
+        return int(self.burning[t, cell[0] * self.D + cell[1]]) / self.n_samples
+
+    def arrival_distribution(self, cell):
+        """Estimated probability of cell igniting at each tick 0..horizon."""
+        column = self.burning[:, cell[0] * self.D + cell[1]].astype(np.int64)
+        return np.diff(column, prepend=0) / self.n_samples
+
+    def path_survival(self, path, t0=0):
+        """
+        Rough probability that a bot walking 'path' from time t0 (entering path[k] at
+        t0 + k + 1) never stands on a burning cell, treating cells as independent.
+        """
+        survival = 1.0
+        for k, cell in enumerate(path):
+            survival *= 1.0 - self.prob_burning(cell, t0 + k + 1)
+        return survival
+
+    def save(self, filename):
+        np.savez_compressed(filename, burning=self.burning, n_samples=self.n_samples,
+                            D=self.D, complete=self.complete)
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as data:
+            return cls(data["burning"], int(data["n_samples"]), int(data["D"]),
+                       bool(data["complete"]))
+
+def fire_arrival_map(grid, origin, q, cache_dir="fire_maps", **kwargs):
+    """
+    Returns the FireArrivalMap for (ship, fire origin, q), loading it from cache_dir
+    when it was computed before and computing and saving it otherwise. Extra keyword
+    arguments are passed to FireArrivalMap.compute and are part of the cache key.
+    """
+    options = "".join(f"_{k}{v}" for k, v in sorted(kwargs.items()))
+    name = f"{ship_hash(grid)}_{origin[0]}_{origin[1]}_q{q:.4f}{options}.npz"
+    filename = os.path.join(cache_dir, name)
+    if os.path.exists(filename):
+        return FireArrivalMap.load(filename)
+    arrival_map = FireArrivalMap.compute(grid, origin, q, **kwargs)
+    os.makedirs(cache_dir, exist_ok=True)
+    arrival_map.save(filename)
+    return arrival_map
+
+#############################
+# Ship Library
+#############################
+
+def _bfs_farthest(graph, source):
+    """BFS over a ShipGraph from cell id 'source'; returns (farthest id, its distance)."""
+    dist = {source: 0}
+    queue = deque([source])
+    u = source
+    offsets, targets = graph.offsets, graph.targets
+    while queue:
+        u = queue.popleft()
+        d = dist[u] + 1
+        for v in targets[offsets[u]:offsets[u + 1]]:
+            if v not in dist:
+                dist[v] = d
+                queue.append(v)
+    return u, dist[u]
+
+def ship_stats(grid):
+    """
+    Summary numbers used to index ships:
+      - open_cells: number of open cells.
+      - dead_ends: open cells with exactly one open neighbor.
+      - diameter: longest shortest path, estimated with a double-sweep BFS (BFS from
+        any open cell, then again from the farthest cell found). This is exact on
+        trees and a lower bound otherwise; only the first open cell's component counts.
+    """
+    graph = ship_graph(grid)
+    open_ids = [u for u, is_open in enumerate(graph.open) if is_open]
+    dead_ends = sum(1 for u in open_ids if graph.degree(u) == 1)
+    diameter = 0
+    if open_ids:
+        far, _ = _bfs_farthest(graph, open_ids[0])
+        _, diameter = _bfs_farthest(graph, far)
+    return {"open_cells": len(open_ids), "dead_ends": dead_ends, "diameter": diameter}
+
+def _build_library_entry(task):
+    """Worker for ShipLibrary.ensure_many: generates one ship and packs it."""
+    D, seed = task
+    grid = generate_ship(D, seed=seed)
+    return seed, bytes(_pack_bits(grid)), ship_stats(grid)
+
+class ShipLibrary:
+    """
+    An on-disk store of generated ships, so experiments can reuse ships instead of
+    regenerating them. Layout of 'directory':
+      - ships_<D>.bits: every stored ship of size D as a packed bitmap (1 bit per
+        cell, see _pack_bits), one fixed-size record after another. The files are
+        memory-mapped on load, so opening a library only reads the index.
+      - index.json: one entry per ship with D, seed, its record number and the
+        ship_stats numbers, used by select().
+    Ships are stored by (D, seed), which generate_ship makes reproducible. The
+    library is meant to be written by one process at a time; readers (e.g. sweep
+    workers) can share it freely.
+    """
+    INDEX = "index.json"
+
+    def __init__(self, directory="ships"):
+        self.directory = directory
+        self.entries = {}  # (D, seed) -> index entry
+        self._maps = {}    # D -> (mmap, size in bytes)
+        path = os.path.join(directory, self.INDEX)
+        if os.path.exists(path):
+            with open(path) as f:
+                for entry in json.load(f)["ships"]:
+                    self.entries[(entry["D"], entry["seed"])] = entry
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def seeds(self, D):
+        """Sorted seeds of the stored ships of size D."""
+        return sorted(seed for d, seed in self.entries if d == D)
+
+    def _data_file(self, D):
+        return os.path.join(self.directory, f"ships_{D}.bits")
+
+    def _record(self, D, seed):
+        """The packed bitmap of ship (D, seed), as a slice of the memory map."""
+        entry = self.entries.get((D, seed))
+        if entry is None:
+            raise KeyError(f"No ship with D={D}, seed={seed} in {self.directory}.")
+        record_size = (D * D + 7) // 8
+        end = (entry["record"] + 1) * record_size
+        mapped = self._maps.get(D)
+        if mapped is None or mapped[1] < end:
+            if mapped is not None:
+                mapped[0].close()
+            with open(self._data_file(D), "rb") as f:
+                mapped = (mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ),
+                          os.path.getsize(self._data_file(D)))
+            self._maps[D] = mapped
+        return mapped[0], end - record_size
+
+    def get(self, D, seed):
+        """Ship (D, seed) as a grid (list of lists). Raises KeyError if not stored."""
+        data, offset = self._record(D, seed)
+        return _unpack_bits(data[offset:offset + (D * D + 7) // 8], D)
+
+    def get_array(self, D, seed):
+        """Ship (D, seed) as a (D, D) uint8 NumPy array, unpacked from the memory map."""
+        _require_numpy()
+        data, offset = self._record(D, seed)
+        bits = np.frombuffer(data, dtype=np.uint8, count=(D * D + 7) // 8, offset=offset)
+        return np.unpackbits(bits, count=D * D).reshape(D, D)
+
+    def stats(self, D, seed):
+        """The ship_stats numbers stored for ship (D, seed)."""
+        entry = self.entries[(D, seed)]
+        return {key: entry[key] for key in ("open_cells", "dead_ends", "diameter")}
+
+    def _append(self, D, seed, bits, stats):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._data_file(D), "ab") as f:
+            record = f.tell() // len(bits)
+            f.write(bits)
+        entry = {"D": D, "seed": seed, "record": record}
+        entry.update(stats)
+        self.entries[(D, seed)] = entry
+
+    def save_index(self):
+        """Writes index.json (through a temporary file, so readers never see half of it)."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, self.INDEX)
+        entries = sorted(self.entries.values(), key=lambda e: (e["D"], e["seed"]))
+        with open(path + ".tmp", "w") as f:
+            json.dump({"ships": entries}, f)
+        os.replace(path + ".tmp", path)
+
+    def add(self, grid, seed, save=True):
+        """Stores a ship generated with 'seed'; does nothing if it is already stored."""
+        D = len(grid)
+        if (D, seed) not in self.entries:
+            self._append(D, seed, bytes(_pack_bits(grid)), ship_stats(grid))
+            if save:
+                self.save_index()
+
+    def ensure(self, D, seed):
+        """Ship (D, seed), generated and stored first if the library does not have it."""
+        if (D, seed) not in self.entries:
+            grid = generate_ship(D, seed=seed)
+            self.add(grid, seed)
+            return grid
+        return self.get(D, seed)
+
+    def ensure_many(self, D, seeds, workers=1):
+        """
+        Makes sure every ship (D, seed) for 'seeds' is stored, generating the missing
+        ones (across a process pool when workers != 1) and saving the index once.
+        """
+        tasks = [(D, seed) for seed in seeds if (D, seed) not in self.entries]
+        if not tasks:
+            return
+        if workers == 1:
+            built = map(_build_library_entry, tasks)
+            for seed, bits, stats in built:
+                self._append(D, seed, bits, stats)
+        else:
+            import multiprocessing
+            with multiprocessing.Pool(workers) as pool:
+                for seed, bits, stats in pool.imap(_build_library_entry, tasks):
+                    self._append(D, seed, bits, stats)
+        self.save_index()
+
+    def select(self, D=None, **ranges):
+        """
+        (D, seed) keys of the stored ships matching every condition, sorted.
+        Each keyword names a stat and gives an inclusive (low, high) range where
+        either bound may be None, e.g.
+            library.select(D=50, dead_ends=(None, 40), diameter=(200, None))
+        """
+        keys = []
+        for key, entry in self.entries.items():
+            if D is not None and key[0] != D:
+                continue
+            for stat, (low, high) in ranges.items():
+                value = entry[stat]
+                if (low is not None and value < low) or (high is not None and value > high):
+                    break
+            else:
+                keys.append(key)
+        return sorted(keys)
+
+    def close(self):
+        for data, _ in self._maps.values():
+            data.close()
+        self._maps = {}
+
+_SHIP_LIBRARIES = {}  # directory -> ShipLibrary, so each process reads an index once
+
+def open_ship_library(directory):
+    """Returns the ShipLibrary for 'directory', opening it on first use in this process."""
+    library = _SHIP_LIBRARIES.get(directory)
+    if library is None:
+        library = _SHIP_LIBRARIES[directory] = ShipLibrary(directory)
+    return library
+
+#############################
+# Parameter Sweep
+#############################
+
+# Bot strategies by name, so sweep tasks stay small and picklable.
+BOTS = {"Bot1": Bot1, "Bot2": Bot2, "Bot3": Bot3, "Bot4": Bot4, "Bot5": Bot5}
+# Bot5 spends a time budget on rollouts every step, so sweeps only include it on request.
+DEFAULT_SWEEP_BOTS = ["Bot1", "Bot2", "Bot3", "Bot4"]
+
+def q_range(step=0.05):
+    """Flammability values from 0.0 to 1.0 (inclusive) in increments of 'step'."""
+    n = int(round(1.0 / step))
+    return [round(k * step, 10) for k in range(n + 1)]
+
+def _sweep_ship(task):
+    """
+    Worker for run_sweep: generates one ship from its seed and runs every
+    (q, trial, bot) combination on it. Within a trial all bots share the same
+    seed, so they face the same placement and the same fire.
+    With a ship_dir, the ship is read from that ShipLibrary instead.
+    With a record_dir, every failed run is saved there as a recording.
+    Returns ({(bot_name, q): [successes, trials]}, stats), where stats is None or,
+    when instrumentation was requested, {bot_name: Stats}.
+    """
+    ship_seed, D, q_values, bot_names, trials, ship_dir, record_dir, instrument = task
+    if ship_dir is None:
+        grid = generate_ship(D, seed=ship_seed)
+    else:
+        grid = open_ship_library(ship_dir).get(D, ship_seed)
+    rng = random.Random(ship_seed)
+    counts = {}
+    stats = {name: Stats() for name in bot_names} if instrument else None
+    record = record_dir is not None
+    for q in q_values:
+        for _ in range(trials):
+            trial_seed = rng.getrandbits(32)
+            for name in bot_names:
+                result = run_simulation(grid, BOTS[name], q, seed=trial_seed, record=record,
+                                        stats=stats[name] if instrument else None)
+                if record and not result.success:
+                    filename = f"ship{ship_seed}_{name}_q{q:.2f}_{trial_seed}.firelog"
+                    save_recording(result.recording, os.path.join(record_dir, filename))
+                entry = counts.setdefault((name, q), [0, 0])
+                entry[0] += result.success
+                entry[1] += 1
+    return counts, stats
+
+def run_sweep(D=50, q_values=None, bot_names=None, n_ships=100, trials_per_ship=10,
+              workers=None, base_seed=0, on_progress=None, ship_dir=None, record_dir=None,
+              stats=None):
+    """
+    Runs a success-rate sweep over ships, q values and bot strategies.
+    Ships use seeds base_seed .. base_seed + n_ships - 1 and are spread across a
+    process pool (workers=None uses every CPU, workers=1 runs in this process).
+    Each point of the curve gets n_ships * trials_per_ship trials. Results are merged
+    as each ship finishes; on_progress(table, ships_done) is called after each merge.
+    With a ship_dir, ships come from that ShipLibrary; missing ones are generated
+    and stored first, so later sweeps over the same seeds skip generation.
+    With a record_dir, failed runs are saved there as recordings (see load_recording).
+    With a dict as 'stats', every run is instrumented and the dict is filled with one
+    Stats per bot name, merged across all ships.
+    Returns {(bot_name, q): [successes, trials]}.
+    """
+    if q_values is None:
+        q_values = q_range()
+    if bot_names is None:
+        bot_names = DEFAULT_SWEEP_BOTS
+    seeds = range(base_seed, base_seed + n_ships)
+    if ship_dir is not None:
+        open_ship_library(ship_dir).ensure_many(D, seeds, workers)
+    tasks = [(seed, D, q_values, bot_names, trials_per_ship, ship_dir, record_dir,
+              stats is not None) for seed in seeds]
+
+    table = {}
+    def merge(result, ships_done):
+        counts, per_bot = result
+        for key, (successes, trials) in counts.items():
+            entry = table.setdefault(key, [0, 0])
+            entry[0] += successes
+            entry[1] += trials
+        if per_bot is not None:
+            for name, bot_stats in per_bot.items():
+                stats.setdefault(name, Stats()).merge(bot_stats)
+        if on_progress is not None:
+            on_progress(table, ships_done)
+
+    if workers == 1:
+        for k, task in enumerate(tasks):
+            merge(_sweep_ship(task), k + 1)
+    else:
+        import multiprocessing
+        with multiprocessing.Pool(workers) as pool:
+            for k, result in enumerate(pool.imap_unordered(_sweep_ship, tasks)):
+                merge(result, k + 1)
+    return table
+
+def format_sweep_table(table):
+    """Formats a run_sweep table as success rates, one row per q and one column per bot."""
+    bot_names = sorted({name for name, _ in table})
+    q_values = sorted({q for _, q in table})
+    lines = ["q     " + "".join(f"{name:>8}" for name in bot_names)]
+    for q in q_values:
+        row = f"{q:<6.2f}"
+        for name in bot_names:
+            successes, trials = table.get((name, q), (0, 0))
+            row += f"{successes / trials:>8.3f}" if trials else f"{'-':>8}"
+        lines.append(row)
+    return "\n".join(lines)
+
 #############################
 # UI / Simulation with Pygame
 #############################
@@ -279,44 +2684,126 @@ ORANGE   = (255, 165, 0)
 # Global parameters for the grid and simulation
 D = 50             # Grid dimensions (D x D)
 CELL_SIZE = 20     # Size of each cell in pixels
-WIDTH = D * CELL_SIZE
-HEIGHT = D * CELL_SIZE + 50  # extra space for text/status
-FPS = 5           # Simulation frames per second
+MAX_GRID_PIXELS = 1000  # Larger ships get smaller cells to fit on screen
+FPS = 30          # Display frames per second
+TICKS_PER_SECOND = 5  # Default simulation speed, independent of FPS
 q = 0.8           # Flammability parameter
 
-def draw_grid(screen, grid):
+def _import_pygame():
+    """Imports pygame on first use of the UI."""
+    global pygame
+    if pygame is None:
+        import pygame as _pygame
+        pygame = _pygame
+    return pygame
+
+def cell_size_for(D):
+    """Cell size in pixels that keeps a D x D ship within MAX_GRID_PIXELS."""
+    return max(1, min(CELL_SIZE, MAX_GRID_PIXELS // D))
+
+def window_size(D):
+    cell = cell_size_for(D)
+    return D * cell, D * cell + 50  # extra space for text/status
+
+def draw_grid(screen, grid, cell_size=CELL_SIZE):
     """Draws the ship grid."""
     for i in range(len(grid)):
         for j in range(len(grid[0])):
-            rect = pygame.Rect(j * CELL_SIZE, i * CELL_SIZE, CELL_SIZE, CELL_SIZE)
+            rect = pygame.Rect(j * cell_size, i * cell_size, cell_size, cell_size)
             if grid[i][j] == 1:
                 pygame.draw.rect(screen, WHITE, rect)
             else:
                 pygame.draw.rect(screen, BLACK, rect)
-            pygame.draw.rect(screen, GRAY, rect, 1)  # grid lines
+            if cell_size > 3:
+                pygame.draw.rect(screen, GRAY, rect, 1)  # grid lines
 
-def draw_entities(screen, bot_pos, button, fire_set):
+def draw_entities(screen, bot_pos, button, fire_set, cell_size=CELL_SIZE):
     """Draws the bot, the button, and the fire cells."""
     # Draw fire cells (red)
     for (i, j) in fire_set:
-        rect = pygame.Rect(j * CELL_SIZE, i * CELL_SIZE, CELL_SIZE, CELL_SIZE)
+        rect = pygame.Rect(j * cell_size, i * cell_size, cell_size, cell_size)
         pygame.draw.rect(screen, RED, rect)
     # Draw button cell (green)
     i, j = button
-    rect = pygame.Rect(j * CELL_SIZE, i * CELL_SIZE, CELL_SIZE, CELL_SIZE)
+    rect = pygame.Rect(j * cell_size, i * cell_size, cell_size, cell_size)
     pygame.draw.rect(screen, GREEN, rect)
     # Draw bot (blue circle)
     i, j = bot_pos
-    center = (j * CELL_SIZE + CELL_SIZE // 2, i * CELL_SIZE + CELL_SIZE // 2)
-    radius = CELL_SIZE // 2 - 2
+    center = (j * cell_size + cell_size // 2, i * cell_size + cell_size // 2)
+    radius = max(1, cell_size // 2 - 2)
     pygame.draw.circle(screen, BLUE, center, radius)
 
+_FONTS = {}
+
+def get_font(size):
+    """Returns a cached font; creating a SysFont is slow, so it is done once per size."""
+    font = _FONTS.get(size)
+    if font is None:
+        font = _FONTS[size] = pygame.font.SysFont(None, size)
+    return font
+
 def draw_text(screen, text, pos, color=ORANGE, size=24):
     """Renders text on the screen."""
-    font = pygame.font.SysFont(None, size)
-    img = font.render(text, True, color)
+    img = get_font(size).render(text, True, color)
     screen.blit(img, pos)
 
+class GridRenderer:
+    """
+    Draws a simulation with dirty rectangles. The static ship is rendered once to a
+    background surface; each frame then redraws only the cells whose state changed
+    (newly burning cells and the bot's old and new cells) plus the status line, and
+    pushes just those rectangles to the display with pygame.display.update(rects).
+    """
+    def __init__(self, screen, grid, button, fire_set):
+        self.screen = screen
+        self.grid = grid
+        self.button = button
+        self.fire_set = fire_set
+        self.cell = cell_size_for(len(grid))
+        size = len(grid) * self.cell
+        self.background = pygame.Surface((size, size))
+        draw_grid(self.background, grid, self.cell)
+        self.status_rect = pygame.Rect(0, size, size, screen.get_height() - size)
+        self.bot_pos = None
+
+    def draw_full(self, bot_pos, fire_set=None, status=""):
+        """Redraws everything (used for the first frame and the result screen)."""
+        if fire_set is not None:
+            self.fire_set = fire_set
+        self.screen.fill(BLACK)
+        self.screen.blit(self.background, (0, 0))
+        draw_entities(self.screen, bot_pos, self.button, self.fire_set, self.cell)
+        draw_text(self.screen, status, (10, self.status_rect.y + 10))
+        self.bot_pos = bot_pos
+        pygame.display.flip()
+
+    def _draw_cell(self, cell):
+        i, j = cell
+        c = self.cell
+        rect = pygame.Rect(j * c, i * c, c, c)
+        self.screen.blit(self.background, rect, rect)
+        if cell in self.fire_set:
+            pygame.draw.rect(self.screen, RED, rect)
+        if cell == self.button:
+            pygame.draw.rect(self.screen, GREEN, rect)
+        if cell == self.bot_pos:
+            center = (j * c + c // 2, i * c + c // 2)
+            pygame.draw.circle(self.screen, BLUE, center, max(1, c // 2 - 2))
+        return rect
+
+    def update(self, bot_pos, new_fire, status):
+        """Redraws the changed cells and the status line."""
+        dirty = set(new_fire)
+        if self.bot_pos is not None:
+            dirty.add(self.bot_pos)
+        dirty.add(bot_pos)
+        self.bot_pos = bot_pos
+        rects = [self._draw_cell(cell) for cell in dirty]
+        self.screen.fill(BLACK, self.status_rect)
+        draw_text(self.screen, status, (10, self.status_rect.y + 10))
+        rects.append(self.status_rect)
+        pygame.display.update(rects)
+
 def choose_bot_menu(screen):
     """Displays a menu to select a bot strategy."""
     screen.fill(BLACK)
@@ -325,7 +2812,8 @@ def choose_bot_menu(screen):
     draw_text(screen, "2: Bot2 - Replan every step (avoid fire)", (50, 130))
     draw_text(screen, "3: Bot3 - Replan & avoid adjacent fire", (50, 160))
     draw_text(screen, "4: Bot4 - A* with risk penalty", (50, 190))
-    draw_text(screen, "Press 1, 2, 3, or 4 to select", (50, 240))
+    draw_text(screen, "5: Bot5 - Monte-Carlo fire rollouts", (50, 220))
+    draw_text(screen, "Press 1, 2, 3, 4, or 5 to select", (50, 270))
     pygame.display.flip()
 
     chosen_bot = None
@@ -343,103 +2831,221 @@ def choose_bot_menu(screen):
                     chosen_bot = Bot3
                 elif event.key == pygame.K_4:
                     chosen_bot = Bot4
+                elif event.key == pygame.K_5:
+                    chosen_bot = Bot5
     return chosen_bot
 
-def run_simulation_ui(grid, bot_class, q):
+def run_simulation_ui(grid, bot_class, q, tps=TICKS_PER_SECOND, stats=None):
     """
     Runs the simulation with a UI.
     Places the bot, the button, and the initial fire in random open cells.
-    Then updates the simulation step-by-step while drawing the state.
+    The simulation runs on its own clock at 'tps' ticks per second while the screen is
+    redrawn at FPS frames per second from the latest state, so a slow frame never
+    slows the simulation down (several ticks may run between two frames).
+    Controls: Space pauses, N steps once while paused, +/- double or halve the
+    tick rate, and F fast-forwards (ticks as fast as possible).
+    With a Stats object as 'stats', the run is instrumented (including "render" time).
+    Returns "restart" or "quit".
     """
-    open_cells = [(i, j) for i in range(D) for j in range(D) if grid[i][j] == 1]
-    if len(open_cells) < 3:
-        print("Not enough open cells to start simulation.")
-        return
+    try:
+        sim = Simulation(grid, bot_class, q, stats=stats)
+    except ValueError as err:
+        print(err)
+        return "quit"
+    return play_ui(sim, tps)
 
-    bot_pos, button, initial_fire = random.sample(open_cells, 3)
-    # Instantiate the bot (Bot1 requires the start and initial fire, others just need grid and button)
-    if bot_class == Bot1:
-        bot = Bot1(grid, bot_pos, button, initial_fire)
-    else:
-        bot = bot_class(grid, button)
-
-    fire_set = {initial_fire}
-    steps = 0
-    simulation_over = False
-    result_text = ""
+def run_replay_ui(recording, tps=TICKS_PER_SECOND):
+    """Shows a Recording in the UI, with the same controls as run_simulation_ui."""
+    return play_ui(Replay(recording), tps, title="Replay")
 
+def play_ui(sim, tps=TICKS_PER_SECOND, title="Steps"):
+    """
+    Drives a Simulation (or a Replay) on screen until it is over, then shows the
+    result. Returns "restart" or "quit".
+    """
+    grid = sim.grid
     clock = pygame.time.Clock()
     screen = pygame.display.get_surface()
+    renderer = GridRenderer(screen, grid, sim.button, sim.fire_set)
+    renderer.draw_full(sim.bot_pos, status=f"{title}: 0")
 
-    while not simulation_over:
+    paused = False
+    fast_forward = False
+    step_once = False
+    next_tick = time.perf_counter()
+    frame_time = 1.0 / FPS
+
+    while not sim.done:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
+                return "quit"
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_SPACE:
+                    paused = not paused
+                elif event.key == pygame.K_n:
+                    step_once = True
+                elif event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+                    tps = min(tps * 2, 10000)
+                elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                    tps = max(tps / 2, 0.25)
+                elif event.key == pygame.K_f:
+                    fast_forward = not fast_forward
+                    next_tick = time.perf_counter()  # restart the clock from now
 
-        # Bot takes a move.
-        new_bot_pos = bot.next_move(bot_pos, fire_set)
-        bot_pos = new_bot_pos
-        steps += 1
-
-        # Check if bot reaches the button.
-        if bot_pos == button:
-            simulation_over = True
-            result_text = f"SUCCESS in {steps} steps!"
-
-        # Spread the fire.
-        fire_set = update_fire(grid, fire_set, q)
-
-        # Check if bot is on a burning cell.
-        if bot_pos in fire_set:
-            simulation_over = True
-            result_text = f"FAILURE in {steps} steps!"
-
-        # Draw the current simulation state.
-        screen.fill(BLACK)
-        draw_grid(screen, grid)
-        draw_entities(screen, bot_pos, button, fire_set)
-        draw_text(screen, f"Steps: {steps}", (10, HEIGHT - 40))
-        pygame.display.flip()
+        # Advance the simulation clock. At most 80% of a frame is spent ticking, so
+        # rendering and input stay responsive even when ticks are slow.
+        new_fire = []
+        now = time.perf_counter()
+        deadline = now + 0.8 * frame_time
+        if paused or step_once:
+            if step_once and not sim.done:
+                sim.step()
+                new_fire.extend(sim.new_fire)
+            step_once = False
+            next_tick = now
+        else:
+            while not sim.done and (fast_forward or next_tick <= now):
+                sim.step()
+                new_fire.extend(sim.new_fire)
+                next_tick += 1.0 / tps
+                now = time.perf_counter()
+                if now > deadline:
+                    break
+            if fast_forward or next_tick < now - frame_time:
+                # Fast-forward ignores the clock, and when behind the backlog is
+                # dropped instead of bursting.
+                next_tick = now
+
+        status = f"{title}: {sim.steps}   {tps:g} ticks/s"
+        if fast_forward:
+            status += "   FAST"
+        if paused:
+            status += "   PAUSED (N: step)"
+        if sim.stats is None:
+            renderer.update(sim.bot_pos, new_fire, status)
+        else:
+            t = time.perf_counter()
+            renderer.update(sim.bot_pos, new_fire, status)
+            sim.stats.add_time("render", time.perf_counter() - t)
 
         clock.tick(FPS)
 
+    if sim.success:
+        result_text = f"SUCCESS in {sim.steps} steps!"
+    else:
+        result_text = f"FAILURE in {sim.steps} steps!"
+
     # Simulation ended: display result message.
-    screen.fill(BLACK)
-    draw_grid(screen, grid)
-    draw_entities(screen, bot_pos, button, fire_set)
-    draw_text(screen, result_text, (WIDTH // 4, HEIGHT // 2), size=36)
-    draw_text(screen, "Press R to restart or Q to quit", (WIDTH // 4, HEIGHT // 2 + 40))
+    width, height = screen.get_size()
+    renderer.draw_full(sim.bot_pos, sim.fire_set, f"{title}: {sim.steps}")
+    draw_text(screen, result_text, (width // 4, height // 2), size=36)
+    draw_text(screen, "Press R to restart or Q to quit", (width // 4, height // 2 + 40))
     pygame.display.flip()
 
     # Wait for user input.
-    waiting = True
-    while waiting:
+    while True:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
+                return "quit"
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_r:
-                    waiting = False
-                    main()  # Restart the simulation.
+                    return "restart"
                 elif event.key == pygame.K_q:
-                    pygame.quit()
-                    sys.exit()
+                    return "quit"
+        clock.tick(FPS)
 
-def main():
+def main(ship_size=D, tps=TICKS_PER_SECOND, ship_dir=None, stats=None):
+    """
+    Runs the interactive UI. With a ship_dir, ships are picked at random from that
+    ShipLibrary (a new one is generated and stored when it has none of this size).
+    With a Stats object as 'stats', every run is instrumented into it.
+    """
+    library = open_ship_library(ship_dir) if ship_dir is not None else None
+    _import_pygame()
     pygame.init()
-    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    screen = pygame.display.set_mode(window_size(ship_size))
     pygame.display.set_caption("This Bot is on Fire Simulation")
 
-    # Generate the ship (maze)
-    grid = generate_ship(D)
+    # Restarting loops here instead of calling main() again, so the stack stays flat.
+    while True:
+        # Generate the ship (maze), or take one from the library.
+        if library is None:
+            grid = generate_ship(ship_size)
+        else:
+            seeds = library.seeds(ship_size)
+            if seeds:
+                grid = library.get(ship_size, random.choice(seeds))
+            else:
+                grid = library.ensure(ship_size, random.getrandbits(32))
+
+        # Show bot selection menu.
+        chosen_bot = choose_bot_menu(screen)
+
+        # Run the simulation UI with the chosen bot.
+        if run_simulation_ui(grid, chosen_bot, q, tps, stats) != "restart":
+            break
+    pygame.quit()
 
-    # Show bot selection menu.
-    chosen_bot = choose_bot_menu(screen)
+def replay_main(filename, tps=TICKS_PER_SECOND):
+    """Opens a window and replays a saved recording (R replays it again)."""
+    recording = load_recording(filename)
+    _import_pygame()
+    pygame.init()
+    screen = pygame.display.set_mode(window_size(len(recording.grid)))
+    pygame.display.set_caption(f"Replay: {recording.bot_name}, q={recording.q:g}")
+    while run_replay_ui(recording, tps) == "restart":
+        pass
+    pygame.quit()
 
-    # Run the simulation UI with the chosen bot.
-    run_simulation_ui(grid, chosen_bot, q)
+def parse_args():
+    parser = argparse.ArgumentParser(description="This Bot is on Fire simulation")
+    parser.add_argument("--sweep", action="store_true",
+                        help="run a headless success-rate sweep instead of the UI")
+    parser.add_argument("--D", type=int, default=D, help="ship size (default 50)")
+    parser.add_argument("--ships", type=int, default=100, help="number of ships (default 100)")
+    parser.add_argument("--trials", type=int, default=10,
+                        help="trials per ship for each q and bot (default 10)")
+    parser.add_argument("--qstep", type=float, default=0.05, help="q increment (default 0.05)")
+    parser.add_argument("--bots", nargs="+", choices=list(BOTS), default=DEFAULT_SWEEP_BOTS,
+                        help="bot strategies to compare (default Bot1-Bot4)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (default one per CPU)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first ship (default 0)")
+    parser.add_argument("--tps", type=float, default=TICKS_PER_SECOND,
+                        help="UI simulation ticks per second (default 5)")
+    parser.add_argument("--ship-dir", default=None,
+                        help="take ships from (and store new ships in) this ship library")
+    parser.add_argument("--record-dir", default=None,
+                        help="save every failed sweep run to this directory as a recording")
+    parser.add_argument("--replay", metavar="FILE", default=None,
+                        help="replay a saved recording in the UI")
+    parser.add_argument("--stats", metavar="FILE", default=None,
+                        help="instrument the runs and write the counters and phase times "
+                             "to FILE as JSON (one entry per bot for sweeps)")
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    if args.sweep:
+        def report(table, ships_done):
+            print(f"[sweep] {ships_done}/{args.ships} ships done", file=sys.stderr)
+        sweep_stats = {} if args.stats else None
+        table = run_sweep(D=args.D, q_values=q_range(args.qstep), bot_names=args.bots,
+                          n_ships=args.ships, trials_per_ship=args.trials,
+                          workers=args.workers, base_seed=args.seed, on_progress=report,
+                          ship_dir=args.ship_dir, record_dir=args.record_dir,
+                          stats=sweep_stats)
+        print(format_sweep_table(table))
+        if args.stats:
+            with open(args.stats, "w") as f:
+                json.dump({name: s.to_dict() for name, s in sweep_stats.items()}, f,
+                          indent=1, sort_keys=True)
+            for name, bot_stats in sorted(sweep_stats.items()):
+                print(f"\n{name}\n{bot_stats.report()}", file=sys.stderr)
+    elif args.replay:
+        replay_main(args.replay, args.tps)
+    else:
+        ui_stats = Stats() if args.stats else None
+        main(args.D, args.tps, args.ship_dir, ui_stats)
+        if ui_stats is not None:
+            ui_stats.dump(args.stats)
@@ -0,0 +1,162 @@
+import mmap
+import os
+import select
+import struct
+
+# Wire format shared by sender.py, stopandwait.py and receiver.py.
+# Every packet is a fixed 20-byte header followed by the raw payload bytes:
+#   seq   (8 bytes) starting sequence number of the payload bytes
+#   ack   (8 bytes) cumulative ACK number (next sequence number expected)
+#   len   (2 bytes) number of payload bytes
+#   flags (2 bytes) packet type bits, see FLAG_*
+# All fields are unsigned and in network byte order.
+HEADER = struct.Struct("!QQHH")
+HEADER_SIZE = HEADER.size
+# Largest payload that fits in one UDP/IPv4 datagram after our header.
+MAX_CHUNK_SIZE = 65507 - HEADER_SIZE
+# Payload size that keeps a packet (with IP and UDP headers) within a
+# 1500-byte Ethernet MTU.
+MTU_CHUNK_SIZE = 1400
+
+FLAG_DATA = 0x1  # carries application bytes
+FLAG_ACK = 0x2  # acknowledges data up to `ack`
+FLAG_SYN = 0x4  # chunk size negotiation, payload is a SYN_FIELDS
+FLAG_SACK = 0x8  # ACK whose payload lists SACK blocks
+
+# Payload of SYN packets: the proposed (or, with FLAG_ACK, accepted)
+# chunk size and the length of the file to be sent. SYN packets use no
+# sequence space.
+SYN_FIELDS = struct.Struct("!IQ")
+
+# Payload of SACK packets: up to MAX_SACK_BLOCKS (start, end) ranges of
+# sequence space received above the cumulative ACK, end exclusive.
+SACK_BLOCK = struct.Struct("!QQ")
+MAX_SACK_BLOCKS = 4
+
+
+# Message class: we use this class to structure our protocol message.
+# `msg` is the payload as bytes (or a memoryview over the received
+# datagram, see `deserialize`).
+class Msg:
+    def __init__(self, seq, ack, msg, flags=None):
+        self.seq = int(seq)  # Sequence number
+        self.ack = int(ack)  # Acknowledgment number
+        if isinstance(msg, str):
+            msg = msg.encode("utf-8")
+        self.msg = msg  # Message content
+        self.len = len(msg)  # Length of the message
+        if flags is None:
+            flags = FLAG_DATA if self.len else FLAG_ACK
+        self.flags = flags
+
+    def serialize(self):
+        return HEADER.pack(self.seq, self.ack, self.len, self.flags) + self.msg
+
+    def __str__(self):
+        text = bytes(self.msg[:32]).decode("utf-8", "replace").strip()
+        if self.len > 32:
+            text += "..."
+        return f"Seq: {self.seq}   ACK: {self.ack}   Len: {self.len}   Msg: {text}"
+
+    @staticmethod
+    def deserialize(ser_bytes_msg):
+        # The payload is a memoryview slice of the datagram, so it is not copied.
+        if len(ser_bytes_msg) < HEADER_SIZE:
+            print("Error in deserializing into Msg object.")
+            exit(-1)
+        seq, ack, length, flags = HEADER.unpack_from(ser_bytes_msg)
+        payload = memoryview(ser_bytes_msg)[HEADER_SIZE : HEADER_SIZE + length]
+        if len(payload) != length:
+            print("Error in deserializing into Msg object: truncated payload.")
+            exit(-1)
+        return Msg(seq, ack, payload, flags)
+
+
+# Chunk size negotiation. Before any data, the sender proposes a chunk
+# size in a SYN (seq = its initial sequence number) and announces the
+# file length; the receiver answers with SYN|ACK carrying the size it
+# accepts (at most its own maximum) and reads datagrams of exactly
+# that size plus the header from then on. Knowing the length and the
+# initial sequence number up front lets a receiver place data at its
+# file offset even before the length chunk itself arrives.
+def syn_msg(seq, chunk_size, file_len, ack=0, flags=FLAG_SYN):
+    return Msg(seq, ack, SYN_FIELDS.pack(chunk_size, file_len), flags)
+
+
+def syn_fields(msg):
+    """(chunk size, file length) of a SYN or SYN|ACK."""
+    return SYN_FIELDS.unpack_from(msg.msg)
+
+
+def negotiate_chunk_size(cs, receiver_binding, chunk_size, init_seqno, rto, file_len):
+    """Sender side: sends SYNs until a SYN|ACK arrives and returns the accepted size."""
+    syn = syn_msg(init_seqno, chunk_size, file_len)
+    while True:
+        cs.sendto(syn.serialize(), receiver_binding)
+        print(f"Transmitted SYN, proposing chunk size {chunk_size}")
+        ready = select.select([cs], [], [], rto)
+        if ready[0]:
+            data, _ = cs.recvfrom(HEADER_SIZE + SYN_FIELDS.size)
+            reply = Msg.deserialize(data)
+            if reply.flags & FLAG_SYN and reply.flags & FLAG_ACK:
+                accepted = syn_fields(reply)[0]
+                print(f"Received SYN|ACK, chunk size {accepted}")
+                return accepted
+
+
+def pack_sack_blocks(blocks):
+    return b"".join(SACK_BLOCK.pack(start, end) for start, end in blocks)
+
+
+def unpack_sack_blocks(msg):
+    """SACK blocks carried by an ACK ([] unless it has FLAG_SACK)."""
+    if not msg.flags & FLAG_SACK:
+        return []
+    return [SACK_BLOCK.unpack_from(msg.msg, k) for k in range(0, msg.len, SACK_BLOCK.size)]
+
+
+def map_file(filename):
+    """The file's bytes, memory-mapped read-only so pages are only read when a chunk is sent."""
+    with open(filename, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""  # empty files cannot be mapped
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+# The sender's view of a transfer: a first chunk holding the file
+# length as ASCII digits, then the file cut into chunks of
+# `chunk_size` bytes (the last one may be shorter). All chunks but the
+# first have the same size, so the chunk starting at a sequence number
+# is found by arithmetic instead of a lookup table. `filedata` is any
+# bytes-like object; with a mapped file (see `map_file`) chunks are
+# views into the mapping, so only the packets in flight are ever read.
+class FileChunks:
+    def __init__(self, filedata, chunk_size, init_seqno):
+        self.data = memoryview(filedata)
+        self.chunk_size = chunk_size
+        self.init_seqno = init_seqno
+        self.header = str(len(filedata)).encode("ascii")
+        self.data_seqno = init_seqno + len(self.header)  # seq of the first file byte
+        self.content_len = len(self.header) + len(filedata)
+        self.final_seqno = init_seqno + self.content_len
+
+    def chunk(self, seq):
+        """Payload of the packet starting at `seq` (a view, not a copy)."""
+        if seq == self.init_seqno:
+            return self.header
+        offset = seq - self.data_seqno
+        if offset < 0 or offset % self.chunk_size or seq >= self.final_seqno:
+            raise ValueError(f"No chunk starts at sequence number {seq}")
+        return self.data[offset : offset + self.chunk_size]
+
+    def index(self, seq):
+        """Position of the chunk starting at `seq` (the length chunk is 0)."""
+        if seq == self.init_seqno:
+            return 0
+        return 1 + (seq - self.data_seqno) // self.chunk_size
+
+    def next_seqno(self, seq):
+        """Sequence number of the chunk after the one starting at `seq`."""
+        if seq == self.init_seqno:
+            return self.data_seqno
+        return min(seq + self.chunk_size, self.final_seqno)
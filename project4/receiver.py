@@ -3,12 +3,26 @@ import time
 import random
 import socket
 import argparse
+from bisect import bisect_left, bisect_right
+
+from protocol import (FLAG_ACK, FLAG_SACK, FLAG_SYN, HEADER_SIZE,
+                      MAX_CHUNK_SIZE, MAX_SACK_BLOCKS, Msg,
+                      pack_sack_blocks, syn_fields, syn_msg)
 
 # Settings
-# Maximum chunk size used for transmission.
-# This value must be larger than the chunk size used in the
-# sender. Currently, we set this to 100.
-MAX_CHUNK_SIZE = 100
+# The chunk size is negotiated with the sender at startup: the
+# sender proposes one, and the receiver accepts it up to
+# --maxchunk (default MAX_CHUNK_SIZE, the largest UDP payload)
+# and reads datagrams of exactly the accepted size plus the
+# protocol header.
+# Datagrams read before the negotiation only need room for a SYN
+# or a file length.
+PRE_SYN_READ_SIZE = HEADER_SIZE + 32
+# Socket receive buffer, in datagrams of the negotiated size.
+RCVBUF_DATAGRAMS = 256
+# With --ooo_enabled, data more than this many chunks beyond the
+# cumulative ACK is dropped, which bounds the reassembly state.
+RCV_WINDOW_CHUNKS = 1024
 # dummy SEQ number used for receiver's ack packets
 __SEQ_UNUSED = 235347
 # Loss emulation default settings.
@@ -30,50 +44,6 @@ ack_iid_N = 4
 pkt_losstype = 'everyN'
 ack_losstype = 'everyN'
 
-# Message class: we use this class to structure our protocol
-# message. The fields in our protocol are:
-# seq no: the starting sequence number of application bytes
-# on this packet
-# ack no: the cumulative ACK number of application bytes
-# being acknowledged in this ACK
-# len: the number of application bytes being transmitted on
-# this packet
-# msg: the actual application payload on this packet
-# The methods `serialize` and `deserialize` allow the
-# conversion of a protocol object to bytes transmissible
-# through a sendto() system call and the bytes from a
-# recvfrom() system call into a protocol structure.
-class Msg:
-    def __init__(self, seq, ack, msg):
-        self.seq = int(seq)
-        self.ack = int(ack)
-        self.msg = str(msg)
-        self.len = len(self.msg)
-
-    def serialize(self):
-        ser_repr = (str(self.seq) + ' | ' + str(self.ack) + ' | ' +
-                    str(self.len) + ' | ' + self.msg)
-        return ser_repr.encode('utf-8')
-
-    def __str__(self):
-        repr  = "Seq: " + str(self.seq) + '   '
-        repr += "ACK: " + str(self.ack) + '   '
-        repr += "Len: " + str(self.len) + '   '
-        repr += "Msg: " + self.msg.strip()
-        return repr
-
-    @staticmethod
-    def deserialize(ser_bytes_msg):
-        ser_msg = ser_bytes_msg.decode('utf-8')
-        parts = ser_msg.split('|')
-        if len(parts) >= 4:
-            return Msg(int(parts[0]),
-                       int(parts[1]),
-                       '|'.join(parts[3:])[1:])
-        else:
-            print("Error in deserializing into Msg object.")
-            exit(-1)
-
 ## Helper methods.
 ### Argument parsing
 def parse_args():
@@ -103,16 +73,30 @@ def parse_args():
     parser.add_argument('--ooo_enabled',
                         action = "store_true",
                         dest = "ooo_enabled",
-                        help = "enable out of order data buffering (default false)")
+                        help = "enable out of order data buffering with"
+                               " selective ACKs (default false)")
+    parser.add_argument('--rcvwin',
+                        type = int,
+                        help = "with --ooo_enabled, how many chunks beyond "
+                               "the cumulative ACK to accept (default {})".format(
+                                   RCV_WINDOW_CHUNKS),
+                        default = RCV_WINDOW_CHUNKS)
     parser.add_argument('--port',
                         type = int,
                         help = "receiver local port to bind to (default 50007)",
                         default = 50007)
+    parser.add_argument('--maxchunk',
+                        type = int,
+                        help = "largest chunk size to accept from the "
+                               "sender (default {})".format(MAX_CHUNK_SIZE),
+                        default = MAX_CHUNK_SIZE)
     parser.add_argument('--outfile',
                         type = str,
                         help = "name of output file (default test-output.txt)",
                         default = "test-output.txt")
     args = parser.parse_args()
+    if args.maxchunk < 1:
+        parser.error("--maxchunk must be at least 1")
     return vars(args)
 
 def set_loss_params(args):
@@ -152,7 +136,7 @@ def set_loss_params(args):
 ### message `msg`.
 def construct_ack(msg):
     ack_num = msg.seq + msg.len
-    return Msg(__SEQ_UNUSED, ack_num, '')
+    return Msg(__SEQ_UNUSED, ack_num, b'')
 
 ### Loss emulation methods
 def noLoss():
@@ -234,21 +218,189 @@ def init_socket(local_receiver_port):
     ss.bind(('', local_receiver_port))
     return ss
 
-### Put filedata
-def put_filedata(filename, filedata):
+### Open the output file. Data is written to it as it arrives
+### instead of being collected in memory first.
+def open_outfile(filename):
     print ("[R] Writing results into {}".format(filename))
-    f = open(filename, 'w')
-    f.write(filedata)
-    f.close()
+    return open(filename, 'wb')
+
+### Write `data` at byte `offset` of the output file (only seeking
+### when it is not the current position).
+def write_at(outfile, offset, data):
+    if outfile.tell() != offset:
+        outfile.seek(offset)
+    outfile.write(data)
+
+### Answer a (possibly retransmitted, if our SYN|ACK was lost)
+### SYN: accept its chunk size up to `max_chunk` and size the
+### socket receive buffer to match. Returns the accepted chunk
+### size and the file length the sender announced.
+def accept_syn(ss, msg, sender_addr, max_chunk):
+    chunk_size, file_len = syn_fields(msg)
+    # Datagrams are read at the chunk size, so a chunk must be
+    # able to hold the file length chunk (and so at least one
+    # byte), whatever the sender proposed.
+    header_len = len(str(file_len))
+    if header_len > max_chunk:
+        print ("[R] Error: file length chunk does not fit in"
+               " --maxchunk {}, quitting.".format(max_chunk))
+        ss.close()
+        exit(-1)
+    chunk_size = max(header_len, min(chunk_size, max_chunk))
+    ss.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF,
+                  RCVBUF_DATAGRAMS * (HEADER_SIZE + chunk_size))
+    print ("[R] Accepted chunk size {}".format(chunk_size))
+    lossy_sendto(ss, syn_msg(__SEQ_UNUSED, chunk_size, file_len,
+                             msg.seq, FLAG_SYN | FLAG_ACK),
+                 sender_addr)
+    return chunk_size, file_len
 
 ############################################
-# Main receive loop
-def receiver(ss, ooo_enabled):
-    def get_msg_ack():
-        data_from_sender, sender_addr = lossy_recvfrom(
-            ss, MAX_CHUNK_SIZE)
+# Selective repeat reassembly.
+# Tracks which sequence numbers above the cumulative ACK
+# (`rcv_nxt`) have arrived, as sorted, disjoint and non-adjacent
+# [start, end) blocks. The data itself goes straight to its place
+# in the output file, so only these block boundaries are kept in
+# memory, and anything further than `max_ahead` beyond `rcv_nxt`
+# is refused.
+class ReassemblyBuffer:
+    def __init__(self, rcv_nxt, final_seqno, max_ahead):
+        self.rcv_nxt = rcv_nxt
+        self.final_seqno = final_seqno
+        self.max_ahead = max_ahead
+        self.starts = []
+        self.ends = []
+        self.latest = None # a seq in the block last added to
+
+    def complete(self):
+        return self.rcv_nxt >= self.final_seqno
+
+    ### Record `length` bytes starting at `seq`. Returns the
+    ### [start, end) part of them that may be stored (trimmed to
+    ### the window, overlapping data that already arrived is
+    ### included since it is identical), or None if nothing in
+    ### the segment is new.
+    def add(self, seq, length):
+        start = max(seq, self.rcv_nxt)
+        end = min(seq + length, self.final_seqno,
+                  self.rcv_nxt + self.max_ahead)
+        if start >= end:
+            return None
+        # Blocks overlapping or touching [start, end) are merged
+        # with it.
+        lo = bisect_left(self.ends, start)
+        hi = bisect_right(self.starts, end)
+        if lo < hi:
+            if self.starts[lo] <= start and end <= self.ends[lo]:
+                return None
+            new_start = min(start, self.starts[lo])
+            new_end = max(end, self.ends[hi - 1])
+        else:
+            new_start, new_end = start, end
+        self.starts[lo:hi] = [new_start]
+        self.ends[lo:hi] = [new_end]
+        self.latest = new_start
+        if new_start == self.rcv_nxt:
+            # The hole at the cumulative ACK is plugged.
+            self.rcv_nxt = self.ends.pop(0)
+            self.starts.pop(0)
+            if lo < hi:
+                print ("[R] Plugged a hole in seq space"
+                       " up to seq {}".format(self.rcv_nxt))
+        return start, end
+
+    ### Up to `n` blocks for a SACK, the most recently changed
+    ### one first and the others in sequence order.
+    def sack_blocks(self, n):
+        blocks = list(zip(self.starts[:n], self.ends[:n]))
+        if self.latest is not None and self.latest >= self.rcv_nxt:
+            k = bisect_right(self.starts, self.latest) - 1
+            latest = (self.starts[k], self.ends[k])
+            if latest in blocks:
+                blocks.remove(latest)
+            blocks = [latest] + blocks[:n - 1]
+        return blocks
+
+############################################
+# Selective repeat receive loop (--ooo_enabled).
+# The SYN carries the sender's initial sequence number and the
+# file length, so every segment can be placed in the file as
+# soon as it arrives, even ahead of the length chunk. Each ACK
+# is cumulative and lists the blocks received above it, so that
+# the sender only retransmits the holes.
+def receiver_selective(ss, outfile, max_chunk = MAX_CHUNK_SIZE,
+                       rcv_window = RCV_WINDOW_CHUNKS):
+    read_size = PRE_SYN_READ_SIZE
+    buf = None
+    while buf is None or not buf.complete():
+        data_from_sender, sender_addr = lossy_recvfrom(ss, read_size)
         msg = Msg.deserialize(data_from_sender)
         print ("Received    {}".format(str(msg)))
+        if msg.flags & FLAG_SYN:
+            chunk_size, file_len = accept_syn(ss, msg, sender_addr,
+                                              max_chunk)
+            read_size = HEADER_SIZE + chunk_size
+            if buf is None:
+                data_seqno = msg.seq + len(str(file_len))
+                buf = ReassemblyBuffer(msg.seq, data_seqno + file_len,
+                                       rcv_window * chunk_size)
+            continue
+        if buf is None:
+            print ("[R] Data before SYN, dropping")
+            continue
+
+        region = buf.add(msg.seq, msg.len)
+        if region is None:
+            print ("[R] Spurious retransmission of data"
+                   " already at the receiver")
+        else:
+            # The length chunk needs no storing, the SYN
+            # already announced the length.
+            start = max(region[0], data_seqno)
+            end = region[1]
+            if start < end:
+                write_at(outfile, start - data_seqno,
+                         msg.msg[start - msg.seq:end - msg.seq])
+        if buf.starts:
+            print ("[R] Sending dup ACK with SACK blocks")
+
+        ack_msg = Msg(__SEQ_UNUSED, buf.rcv_nxt,
+                      pack_sack_blocks(buf.sack_blocks(MAX_SACK_BLOCKS)),
+                      FLAG_ACK | FLAG_SACK)
+        if not buf.complete():
+            lossy_sendto(ss, ack_msg, sender_addr)
+        else:
+            # Don't drop the very last ACK, see receiver().
+            ss.sendto(ack_msg.serialize(), sender_addr)
+
+    return buf.rcv_nxt - data_seqno
+
+############################################
+# Main receive loop
+def receiver(ss, ooo_enabled, outfile, max_chunk = MAX_CHUNK_SIZE,
+             rcv_window = RCV_WINDOW_CHUNKS):
+    if ooo_enabled:
+        return receiver_selective(ss, outfile, max_chunk, rcv_window)
+    read_size = PRE_SYN_READ_SIZE
+
+    syn_accepted = False
+
+    def get_msg_ack():
+        nonlocal read_size, syn_accepted
+        while True:
+            data_from_sender, sender_addr = lossy_recvfrom(
+                ss, read_size)
+            msg = Msg.deserialize(data_from_sender)
+            print ("Received    {}".format(str(msg)))
+            if not msg.flags & FLAG_SYN:
+                if syn_accepted:
+                    break
+                # Stale data from an earlier transfer.
+                print ("[R] Data before SYN, dropping")
+                continue
+            chunk_size, _ = accept_syn(ss, msg, sender_addr, max_chunk)
+            read_size = HEADER_SIZE + chunk_size
+            syn_accepted = True
         ack_msg = construct_ack(msg)
         return msg, ack_msg, sender_addr
 
@@ -257,73 +409,49 @@ def receiver(ss, ooo_enabled):
     msg, ack_msg, sender_addr = get_msg_ack()
     lossy_sendto(ss, ack_msg, sender_addr) # ACK
     try:
-        total_bytes = int(msg.msg)
+        total_bytes = int(bytes(msg.msg))
     except:
         print ("Error: File length invalid! quitting.")
         ss.close()
         exit(-1)
 
-    # Receive and ACK the subsequent (data) packets
-    output = ''   # final result of the download
-    ooo_data = {} # out of order data buffer, only active if
-                  # ooo_enabled is set.
+    # Receive and ACK the subsequent (data) packets, writing
+    # them to `outfile` as they arrive.
     last_seq_expected = msg.seq + len(msg.msg) + total_bytes - 1
     last_acked = msg.seq + msg.len
+    data_seqno = last_acked # seq of the file's first byte
 
     while last_acked <= last_seq_expected:
         msg, ack_msg, sender_addr = get_msg_ack()
         last_seq_in_msg = msg.seq + msg.len - 1
         if last_acked == msg.seq:
             # Most common case: fresh in-order data
-            # add to existing data buffer
-            output += msg.msg
-            new_ack_num = ack_msg.ack
-            # Uncommon case 1: possible that previously
-            # out-of-order data is now in order. Update
-            # last_acked to the value that corresponds to
-            # the "latest" in-order data, given this last
-            # packet that appears to fill a hole in the
-            # sequence space.
-            if ooo_enabled:
-                while new_ack_num in ooo_data:
-                    new_data = ooo_data[new_ack_num]
-                    output += new_data
-                    ooo_data.pop(new_ack_num)
-                    new_ack_num += len(new_data)
-                    print ("[R] Plugged a hole in seq space"
-                           " up to seq {}".format(
-                               new_ack_num))
-            # cumulative ACK (last_acked) must reflect
-            # latest piece of data that is in order
-            last_acked = new_ack_num
+            # write it out right away
+            outfile.write(msg.msg)
         elif last_acked < msg.seq:
-            # Uncommon case 2: fresh data that creates a
-            # hole in the sequence space.
+            # Uncommon case: fresh data that creates a hole in
+            # the sequence space. The lossy receiver appends
+            # whatever it gets.
             print ("[R] Fresh data creating seq space hole")
-            if not ooo_enabled:
-                output += msg.msg
-            else:
-                print ("[R] Sending dup ACK")
-                ooo_data[msg.seq] = msg.msg
+            outfile.write(msg.msg)
         elif last_acked > last_seq_in_msg:
             # Retransmitted data that receiver has already
             # seen. Previously sent ACKs may have been
-            # dropped. last_acked remains unchanged.
+            # dropped.
             print ("[R] Spurious retransmission of data"
                    " already at the receiver")
             print ("[R] Sending dup ACK")
         else:
             # partially fresh and partially retransmitted
-            # data. We're not handling this case.
+            # data. We're not handling this case (see
+            # receiver_selective).
             print ("[R] Error: Receiver cannot handle mix of"
                    " fresh and retransmitted data.")
             exit(-1)
-        if ooo_enabled: # Use cumulative ACKs
-            ack_msg.ack = last_acked
-        else: # last_acked merely reflects latest data
-            # received. This is OK for a "lossy" receiver,
-            # but not a reliable one.
-            last_acked = ack_msg.ack
+        # last_acked merely reflects latest data received.
+        # This is OK for a "lossy" receiver, but not a
+        # reliable one.
+        last_acked = ack_msg.ack
         # Send the ACK
         if last_acked <= last_seq_expected:
             lossy_sendto(ss, ack_msg, sender_addr)
@@ -335,13 +463,15 @@ def receiver(ss, ooo_enabled):
             ss.sendto(ack_msg.serialize(),
                       sender_addr)
 
-    return output
+    return last_acked - data_seqno
 
 if __name__ == "__main__":
     args = parse_args()
     set_loss_params(args)
     ss = init_socket(args['port'])
-    output = receiver(ss, args['ooo_enabled'])
+    outfile = open_outfile(args['outfile'])
+    receiver(ss, args['ooo_enabled'], outfile, args['maxchunk'],
+             args['rcvwin'])
     ss.close()
-    put_filedata(args['outfile'], output)
+    outfile.close()
     print("[R] Receiver finished downloading file data.")
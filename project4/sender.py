@@ -3,39 +3,24 @@ import select
 import time
 import argparse
 
+from protocol import (
+    FLAG_SYN,
+    MAX_CHUNK_SIZE,
+    MTU_CHUNK_SIZE,
+    FileChunks,
+    Msg,
+    map_file,
+    negotiate_chunk_size,
+    unpack_sack_blocks,
+)
+
 # Settings
 RTO = 0.500  # Retransmission timeout
-CHUNK_SIZE = 8  # Number of application bytes in one packet
+CHUNK_SIZE = MTU_CHUNK_SIZE  # Proposed number of application bytes in one packet
 INIT_SEQNO = 5  # Initial sequence number for sender transmissions
 __ACK_UNUSED = 2345367  # Dummy ACK number for sender's packets
 
 
-# Message class
-class Msg:
-    def __init__(self, seq, ack, msg):
-        self.seq = int(seq)  # Sequence number
-        self.ack = int(ack)  # Acknowledgment number
-        self.msg = str(msg)  # Message content
-        self.len = len(self.msg)  # Length of the message
-
-    def serialize(self):
-        ser_repr = f"{self.seq} | {self.ack} | {self.len} | {self.msg}"
-        return ser_repr.encode("utf-8")
-
-    def __str__(self):
-        return f"Seq: {self.seq}   ACK: {self.ack}   Len: {self.len}   Msg: {self.msg.strip()}"
-
-    @staticmethod
-    def deserialize(ser_bytes_msg):
-        ser_msg = ser_bytes_msg.decode("utf-8")
-        parts = ser_msg.split("|")
-        if len(parts) >= 4:
-            return Msg(int(parts[0].strip()), int(parts[1].strip()), "|".join(parts[3:]).strip())
-        else:
-            print("Error in deserializing into Msg object.")
-            exit(-1)
-
-
 # Helper functions
 def init_socket():
     try:
@@ -48,22 +33,9 @@ def init_socket():
 
 
 def get_filedata(filename):
+    # Memory-mapped, not read: chunks are paged in as they are sent.
     print(f"[S] Transmitting file {filename}")
-    with open(filename, "r") as f:
-        filedata = f.read()
-    return filedata
-
-
-def chunk_data(filedata):
-    messages = [filedata[i : i + CHUNK_SIZE] for i in range(0, len(filedata), CHUNK_SIZE)]
-    messages = [str(len(filedata))] + messages
-    content_len = sum(len(m) for m in messages)
-    seq_to_msgindex = {}
-    accumulated = INIT_SEQNO
-    for i, msg in enumerate(messages):
-        seq_to_msgindex[accumulated] = i
-        accumulated += len(msg)
-    return messages, content_len, seq_to_msgindex
+    return map_file(filename)
 
 
 def parse_args():
@@ -78,80 +50,113 @@ def parse_args():
         default="test-input.txt",
     )
     parser.add_argument("--winsize", type=int, help="Window size (default 4)", default=4)
-    return parser.parse_args()
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        help=f"Payload bytes per packet to propose to the receiver (default {CHUNK_SIZE})",
+        default=CHUNK_SIZE,
+    )
+    args = parser.parse_args()
+    if args.chunksize < 1:
+        parser.error("--chunksize must be at least 1")
+    return args
 
 
 ############################################
 # Main reliable sending function
-def send_reliable(cs, filedata, receiver_binding, win_size):
-    messages, content_len, seq_to_msgindex = chunk_data(filedata)
-
-    # Initialize variables
-    window_list = []  # Tracks sequence numbers and data for current window
-    unacked_packets = {}  # Tracks unacknowledged packets and their send times
+def send_reliable(cs, filedata, receiver_binding, win_size, chunk_size=CHUNK_SIZE):
+    chunk_size = min(chunk_size, MAX_CHUNK_SIZE)
+    chunk_size = negotiate_chunk_size(cs, receiver_binding, chunk_size, INIT_SEQNO, RTO, len(filedata))
+    chunks = FileChunks(filedata, chunk_size, INIT_SEQNO)
+    final_ack = chunks.final_seqno  # Final sequence number expected
+
+    # The window is a ring buffer of win_size slots keyed by sequence
+    # number: the packet starting at seq lives in slot
+    # chunks.index(seq) % win_size. Each slot holds [seq, payload,
+    # last send time, SACKed]; SACKed packets arrived above a hole and
+    # are not retransmitted.
+    window = [None] * win_size
+    base = INIT_SEQNO  # Left edge: oldest unacknowledged sequence number
     next_seq = INIT_SEQNO  # Next sequence number to send
-    last_ack = INIT_SEQNO  # Tracks the cumulative ACK received
-    final_ack = INIT_SEQNO + content_len  # Final sequence number expected
+    dup_acks = 0  # Duplicate ACKs for base received in a row
+
+    def slot(seq):
+        return chunks.index(seq) % win_size
 
-    # Helper function to send packets in the window
+    def transmit(entry, label):
+        m = Msg(entry[0], __ACK_UNUSED, entry[1])
+        cs.sendto(m.serialize(), receiver_binding)
+        print(f"{label} {m}")
+        entry[2] = time.time()
+
+    # Helper function to fill the window with new packets and send them
     def send_window():
-        for seq, msg in window_list:
-            if seq not in unacked_packets:
-                m = Msg(seq, __ACK_UNUSED, msg)
-                cs.sendto(m.serialize(), receiver_binding)
-                print(f"Transmitted {m}")
-                unacked_packets[seq] = time.time()
-
-    # Helper function to retransmit unACKed packets
+        nonlocal next_seq
+        while next_seq < final_ack and chunks.index(next_seq) - chunks.index(base) < win_size:
+            entry = [next_seq, chunks.chunk(next_seq), 0.0, False]
+            window[slot(next_seq)] = entry
+            transmit(entry, "Transmitted")
+            next_seq = chunks.next_seqno(next_seq)
+
+    # Helper function to retransmit packets whose timer expired
     def retransmit_window():
         current_time = time.time()
-        for seq, msg in window_list:
-            if current_time - unacked_packets[seq] >= RTO:
-                m = Msg(seq, __ACK_UNUSED, msg)
-                cs.sendto(m.serialize(), receiver_binding)
-                print(f"Retransmitted {m}")
-                unacked_packets[seq] = current_time
-
-    # Populate initial window
-    while len(window_list) < win_size and next_seq < final_ack:
-        index = seq_to_msgindex[next_seq]
-        msg = messages[index]
-        window_list.append((next_seq, msg))
-        next_seq += len(msg)
+        seq = base
+        while seq < next_seq:
+            entry = window[slot(seq)]
+            if not entry[3] and current_time - entry[2] >= RTO:
+                transmit(entry, "Retransmitted")
+            seq = chunks.next_seqno(seq)
+
+    # Helper function to process an ACK: slide the window, count
+    # duplicates for fast retransmit and mark SACKed packets
+    def handle_ack(ack_msg):
+        nonlocal base, dup_acks
+        ack_num = ack_msg.ack
+        print(f"Received ACK: {ack_num}")
+
+        if ack_num > base:
+            # Cumulative ACK: slide the left edge past every packet
+            # it covers
+            while base < next_seq:
+                entry = window[slot(base)]
+                if entry[0] + len(entry[1]) > ack_num:
+                    break
+                window[slot(base)] = None
+                base = chunks.next_seqno(base)
+            dup_acks = 0
+        elif ack_num == base and base < next_seq:
+            # Fast retransmit: three duplicate ACKs mean the packet
+            # at the left edge was lost, so resend it without
+            # waiting for its timer
+            dup_acks += 1
+            if dup_acks == 3:
+                transmit(window[slot(base)], "Fast retransmitted")
+
+        # Mark the packets inside SACK blocks
+        blocks = unpack_sack_blocks(ack_msg)
+        seq = base
+        while blocks and seq < next_seq:
+            entry = window[slot(seq)]
+            end = seq + len(entry[1])
+            if any(start <= seq and end <= stop for start, stop in blocks):
+                entry[3] = True
+            seq = chunks.next_seqno(seq)
 
     send_window()  # Send initial window
 
     # Main loop
-    while last_ack < final_ack:
+    while base < final_ack:
         ready = select.select([cs], [], [], RTO)
         if ready[0]:  # ACK received
             data_from_receiver, _ = cs.recvfrom(1024)
             ack_msg = Msg.deserialize(data_from_receiver)
-            ack_num = ack_msg.ack
-            print(f"Received ACK: {ack_num}")
-
-            # Identify the sequence corresponding to the ACK
-            seq_acked = ack_num - CHUNK_SIZE
-
-            # Remove acknowledged packets from window_list
-            window_list = [(seq, msg) for seq, msg in window_list if seq != seq_acked]
-
-            # Remove from unacked_packets
-            if seq_acked in unacked_packets:
-                del unacked_packets[seq_acked]
-
-            # Slide the window forward
-            last_ack = max(last_ack, ack_num)
-            while len(window_list) < win_size and next_seq < final_ack:
-                index = seq_to_msgindex[next_seq]
-                msg = messages[index]
-                window_list.append((next_seq, msg))
-                next_seq += len(msg)
-
-            send_window()  # Transmit new packets in the window
-        else:
-            # Timeout occurred, retransmit unacknowledged packets
-            retransmit_window()
+            # A late SYN|ACK for a retransmitted SYN is dropped, but the
+            # timers below are still checked
+            if not ack_msg.flags & FLAG_SYN:
+                handle_ack(ack_msg)
+                send_window()  # Transmit new packets in the window
+        retransmit_window()  # Timers are checked even while ACKs arrive
 
     print("[S] Sender finished all transmissions.")
 
@@ -161,5 +166,5 @@ if __name__ == "__main__":
     filedata = get_filedata(args.infile)
     receiver_binding = ("localhost", args.port)
     cs = init_socket()
-    send_reliable(cs, filedata, receiver_binding, args.winsize)
+    send_reliable(cs, filedata, receiver_binding, args.winsize, args.chunksize)
     cs.close()